@@ -0,0 +1,425 @@
+import sys
+import os
+import hmac
+import json
+import time
+import queue
+import getpass
+import argparse
+import urllib.parse
+import tempfile
+import threading
+import subprocess
+import http.server
+import socketserver
+import collections
+import concurrent.futures
+
+from PyQt5.QtCore import QUrl, Qt, QTimer, QObject, QBuffer
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineProfile, QWebEnginePage
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor
+
+from screenshotstore import ScreenshotStore
+from web import FullPageCapture, ScreenshotWriter
+
+os.environ["QT_QPA_PLATFORM"] = "offscreen"
+os.environ["XDG_RUNTIME_DIR"] = f"/tmp/runtime-{getpass.getuser()}"
+os.environ["QTWEBENGINE_DISABLE_GPU"] = "1"
+if not os.path.exists(os.environ["XDG_RUNTIME_DIR"]):
+    os.makedirs(os.environ["XDG_RUNTIME_DIR"])
+socketserver.TCPServer.allow_reuse_address = True
+
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
+class RequestMonitor(QWebEngineUrlRequestInterceptor):
+    # Stamps the time of the latest request a slot's page made. Runs on
+    # Chromium's IO thread; a float assignment is all it does.
+    def __init__(self):
+        super().__init__()
+        self.last_request = time.monotonic()
+
+    def interceptRequest(self, info):
+        self.last_request = time.monotonic()
+
+class RenderSlot:
+    # One page rendering one URL at a time. Each slot has its own
+    # off-the-record profile so its request monitor only sees its own page.
+    # A URL is captured after loadFinished once no new request has started
+    # for idle_ms (a network-idle heuristic), or when timeout_ms runs out.
+    def __init__(self, index, viewport, idle_ms, timeout_ms, full_page, writer, on_done):
+        self.index = index
+        self.idle_ms = idle_ms
+        self.timeout_ms = timeout_ms
+        self.full_page = full_page
+        self.writer = writer
+        self.on_done = on_done
+        self.profile = QWebEngineProfile()
+        self.monitor = RequestMonitor()
+        if hasattr(self.profile, 'setUrlRequestInterceptor'):
+            self.profile.setUrlRequestInterceptor(self.monitor)
+        else:  # Qt < 5.13
+            self.profile.setRequestInterceptor(self.monitor)
+        self.view = QWebEngineView()
+        self.view.setPage(QWebEnginePage(self.profile, self.view))
+        self.view.resize(*viewport)
+        self.view.show()
+        self.view.page().loadFinished.connect(self.load_finished)
+        self.idle_timer = QTimer()
+        self.idle_timer.timeout.connect(self.check_idle)
+        self.deadline = QTimer()
+        self.deadline.setSingleShot(True)
+        self.deadline.timeout.connect(self.deadline_passed)
+        self.full_page_capture = None
+        self.item = None
+        self.loaded = False
+
+    def busy(self):
+        return self.item is not None
+
+    def render(self, item):
+        self.item = item
+        self.loaded = False
+        self.started = time.time()
+        self.monitor.last_request = time.monotonic()
+        self.deadline.start(self.timeout_ms)
+        self.view.load(QUrl(item['url']))
+
+    def load_finished(self, ok):
+        if self.item is None or self.loaded:
+            return
+        if not ok:
+            self.finish({'error': 'load failed'})
+            return
+        self.loaded = True
+        self.item['load_ms'] = round((time.time() - self.started) * 1000, 1)
+        self.idle_timer.start(50)
+
+    def check_idle(self):
+        if (time.monotonic() - self.monitor.last_request) * 1000 >= self.idle_ms:
+            self.capture('ok')
+
+    def deadline_passed(self):
+        if self.full_page_capture is not None:
+            # Reports 'capture failed' through finished and frees the slot
+            self.full_page_capture.cancel('deadline passed')
+        else:
+            self.capture('timeout')
+
+    def capture(self, status):
+        if self.item is None:
+            return
+        self.idle_timer.stop()
+        self.item['status'] = status
+        if self.full_page:
+            # Scrolling and stitching get their own timeout_ms
+            self.deadline.start(self.timeout_ms)
+            self.full_page_capture = FullPageCapture(self.view, self.writer)
+            self.full_page_capture.finished.connect(
+                lambda blob_name: self.finish({'screenshot': blob_name} if blob_name else {'error': 'capture failed'}))
+            self.full_page_capture.start()
+        else:
+            self.deadline.stop()
+            self.finish({'image': self.view.grab().toImage()})
+
+    def finish(self, result):
+        self.idle_timer.stop()
+        self.deadline.stop()
+        self.full_page_capture = None
+        item, self.item = self.item, None
+        item['render_ms'] = round((time.time() - self.started) * 1000, 1)
+        self.view.page().triggerAction(QWebEnginePage.Stop)
+        self.on_done(self, item, result)
+
+class BatchService(QObject):
+    # Renders submitted URL lists across a bounded pool of slots. Submission
+    # is thread-safe (HTTP handlers call it); everything Qt happens on the
+    # GUI thread via a polled queue. PNG encoding and the store write run on
+    # a small thread pool so the GUI thread only loads and grabs. Finished
+    # jobs are dropped after keep_finished_s so a long-running service does
+    # not grow without bound.
+    def __init__(self, store, pages=4, viewport=(1280, 800), idle_ms=500, timeout_ms=30000, full_page=False,
+                 keep_finished_s=3600):
+        super().__init__()
+        self.store = store
+        self.keep_finished_s = keep_finished_s
+        self.incoming = queue.Queue()
+        self.pending = collections.deque()
+        self.jobs = {}
+        self.next_job = 1
+        self.lock = threading.Lock()
+        self.encoder = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        # Full-page captures stitch and compress their strips on a writer thread
+        self.full_page_writer = ScreenshotWriter(store) if full_page else None
+        self.slots = [RenderSlot(i, viewport, idle_ms, timeout_ms, full_page, self.full_page_writer, self.slot_done)
+                      for i in range(pages)]
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.dispatch)
+        self.timer.start(100)
+
+    def submit(self, urls):
+        with self.lock:
+            self.prune_jobs()
+            job_id = self.next_job
+            self.next_job += 1
+            self.jobs[job_id] = {'id': job_id, 'created': time.time(), 'finished': None,
+                                 'total': len(urls), 'results': []}
+        for url in urls:
+            self.incoming.put({'job': job_id, 'url': url})
+        return job_id
+
+    def prune_jobs(self):
+        # Called with self.lock held.
+        cutoff = time.time() - self.keep_finished_s
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job['finished'] is not None and job['finished'] < cutoff]:
+            del self.jobs[job_id]
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def done(self, job_id):
+        with self.lock:
+            return self.jobs[job_id]['finished'] is not None
+
+    def dispatch(self):
+        while True:
+            try:
+                self.pending.append(self.incoming.get_nowait())
+            except queue.Empty:
+                break
+        for slot in self.slots:
+            if not self.pending:
+                break
+            if not slot.busy():
+                slot.render(self.pending.popleft())
+
+    def slot_done(self, slot, item, result):
+        if 'image' in result:
+            self.encoder.submit(self.save, item, result['image'])
+        else:
+            self.record(item, result)
+        # Start the next URL on this slot right away rather than on the next poll.
+        QTimer.singleShot(0, self.dispatch)
+
+    def save(self, item, image):
+        # Runs on the encoder pool; always records, so the job can finish.
+        buffer = QBuffer()
+        buffer.open(QBuffer.ReadWrite)
+        try:
+            if not image.save(buffer, "PNG"):
+                self.record(item, {'error': 'could not encode screenshot'})
+                return
+            digest = self.store.add(bytes(buffer.data()), item['url'])
+        except Exception as e:
+            self.record(item, {'error': str(e)})
+            return
+        self.record(item, {'screenshot': self.store.blob_name(digest)})
+
+    def record(self, item, result):
+        entry = {key: value for key, value in item.items() if key != 'job'}
+        entry.update(result)
+        with self.lock:
+            job = self.jobs[item['job']]
+            job['results'].append(entry)
+            if len(job['results']) == job['total']:
+                job['finished'] = time.time()
+
+class BatchHandler(http.server.BaseHTTPRequestHandler):
+    service = None
+    # Bearer token required on every request when set (--token).
+    token = None
+    max_body = 1024 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self):
+        if self.token is None:
+            return True
+        supplied = self.headers.get('Authorization', '')
+        if hmac.compare_digest(supplied.encode(), f'Bearer {self.token}'.encode()):
+            return True
+        self.send_error(403)
+        return False
+
+    def do_POST(self):
+        # POST /batch with a JSON list of URLs or one URL per line. Only
+        # http(s) URLs are accepted over HTTP; file:// is for local lists.
+        if self.path != '/batch':
+            self.send_error(404)
+            return
+        if not self.authorized():
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.send_error(400, 'Bad Content-Length')
+            return
+        if length > self.max_body:
+            self.send_error(413)
+            return
+        try:
+            body = self.rfile.read(length).decode()
+            lines = json.loads(body) if body.lstrip().startswith('[') else body.splitlines()
+            if not isinstance(lines, list):
+                raise ValueError('not a list')
+            urls = parse_url_list(lines, schemes=('http', 'https'))
+        except ValueError as e:
+            self.send_error(400, f'Body must be a JSON list or one URL per line of http(s) URLs ({e})')
+            return
+        if not urls:
+            self.send_error(400, 'No URLs given')
+            return
+        job_id = self.service.submit(urls)
+        self.send_json({'id': job_id, 'status': f'/batch/{job_id}'}, 202)
+
+    def do_GET(self):
+        # GET /batch/<id> reports progress and the screenshot path of each URL.
+        if not self.authorized():
+            return
+        if self.path.startswith('/batch/'):
+            try:
+                job = self.service.status(int(self.path[len('/batch/'):]))
+            except ValueError:
+                job = None
+            if job is None:
+                self.send_error(404)
+            else:
+                self.send_json(job)
+        else:
+            self.send_error(404)
+
+def parse_url_list(lines, schemes=('http', 'https', 'file', 'about')):
+    # Raises ValueError for anything that is not a string URL with one of schemes.
+    urls = []
+    for line in lines:
+        if not isinstance(line, str):
+            raise ValueError(f'not a URL: {line!r}')
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not line.startswith(('http://', 'https://', 'file://', 'about:')):
+            line = 'http://' + line
+        parsed = urllib.parse.urlsplit(line)
+        if parsed.scheme not in schemes or (parsed.scheme in ('http', 'https') and not parsed.hostname):
+            raise ValueError(f'unsupported URL: {line}')
+        urls.append(parsed.geturl())
+    return urls
+
+def shard_file(prefix, suffix, text=""):
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    return path
+
+def run_shards(args, urls):
+    # Splits the list across child processes (each with its own Chromium),
+    # then merges their reports. Each child gets its share in a file of its
+    # own, since the list may have come from stdin.
+    children = []
+    for shard in range(args.processes):
+        url_file = shard_file(f"batch-shard-{shard}-", ".txt",
+                              "".join(url + "\n" for url in urls[shard::args.processes]))
+        output = shard_file(f"batch-shard-{shard}-", ".json")
+        command = [sys.executable, os.path.abspath(__file__), url_file,
+                   '--pages', str(args.pages), '--viewport', args.viewport, '--idle-ms', str(args.idle_ms),
+                   '--timeout', str(args.timeout), '--screenshot-dir', args.screenshot_dir, '--output', output]
+        if args.full_page:
+            command.append('--full-page')
+        children.append((subprocess.Popen(command), url_file, output))
+    results = []
+    for process, url_file, output in children:
+        process.wait()
+        os.remove(url_file)
+        try:
+            with open(output) as f:
+                results.extend(json.load(f)['results'])
+        except ValueError:
+            print(f"Shard {url_file} produced no report", file=sys.stderr)
+        os.remove(output)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Render many URLs to screenshots in parallel")
+    parser.add_argument("urls", nargs="?", help="file with one URL per line ('-' for stdin)")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="accept POST /batch requests instead of a file")
+    parser.add_argument("--host", default="127.0.0.1", help="address --serve listens on")
+    parser.add_argument("--token", help="require 'Authorization: Bearer TOKEN' on --serve requests")
+    parser.add_argument("--pages", type=int, default=4, help="pages rendering concurrently per process")
+    parser.add_argument("--processes", type=int, default=1, help="browser processes to split the list across")
+    parser.add_argument("--viewport", default="1280x800", help="WIDTHxHEIGHT")
+    parser.add_argument("--idle-ms", type=int, default=500, help="quiet period with no new requests after load")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a URL is captured regardless")
+    parser.add_argument("--full-page", action="store_true", help="capture the whole document, not just the viewport")
+    parser.add_argument("--screenshot-dir", default=os.path.join(os.getcwd(), "screenshots"))
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+    if not args.urls and not args.serve:
+        parser.error("give a URL file or --serve PORT")
+
+    urls = []
+    if args.urls:
+        try:
+            if args.urls == '-':
+                urls = parse_url_list(sys.stdin)
+            else:
+                with open(args.urls) as f:
+                    urls = parse_url_list(f)
+        except ValueError as e:
+            parser.error(str(e))
+
+    start = time.time()
+    if args.urls and args.processes > 1:
+        results = run_shards(args, urls)
+    else:
+        QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+        app = QApplication(sys.argv)
+        width, height = (int(part) for part in args.viewport.split('x'))
+        service = BatchService(ScreenshotStore(args.screenshot_dir), pages=args.pages, viewport=(width, height),
+                               idle_ms=args.idle_ms, timeout_ms=int(args.timeout * 1000), full_page=args.full_page)
+        if args.serve:
+            BatchHandler.service = service
+            BatchHandler.token = args.token
+            server = ThreadedTCPServer((args.host, args.serve), BatchHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            print(f"Batch screenshot service running at http://{args.host}:{args.serve}/batch")
+            sys.exit(app.exec_())
+        job_id = service.submit(urls)
+        check = QTimer()
+        check.timeout.connect(lambda: service.done(job_id) and app.quit())
+        check.start(200)
+        if urls:
+            app.exec_()
+        service.encoder.shutdown(wait=True)
+        results = service.status(job_id)['results']
+
+    elapsed = time.time() - start
+    for result in results:
+        print(f"{result.get('status', 'error'):>7} {result.get('render_ms', 0):8.0f} ms  {result['url']}", file=sys.stderr)
+    report = {
+        'urls': len(urls),
+        'elapsed_s': round(elapsed, 3),
+        'pages_per_s': round(len(results) / elapsed, 2) if elapsed else 0.0,
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
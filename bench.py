@@ -0,0 +1,260 @@
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import platform
+import functools
+
+import r  # sets the offscreen Qt environment before QApplication exists
+from PyQt5.QtCore import QUrl, Qt, QTimer, QEventLoop, QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+from benchutil import QuietDirectoryHandler, start_fixture_server, percentile
+
+# Encoder settings passed to QImage.save for each streaming mode.
+STREAM_MODES = {
+    "jpeg-q70": ("JPEG", 70),
+    "jpeg-q40": ("JPEG", 40),
+    "png": ("PNG", -1),
+}
+
+FIXTURE_PAGES = {
+    "static_text": """
+        <!DOCTYPE html>
+        <html><body style="font-family: Arial, sans-serif; margin: 40px;">
+            <h1>Static text</h1>
+            <script>
+                for (var i = 0; i < 200; i++) {
+                    document.write('<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor ' + i + '</p>');
+                }
+            </script>
+        </body></html>
+    """,
+    "css_animation": """
+        <!DOCTYPE html>
+        <html><head><style>
+            body { margin: 0; background: #222; }
+            .box { width: 120px; height: 120px; position: absolute; border-radius: 12px;
+                   animation: move 2s linear infinite alternate; }
+            @keyframes move { from { transform: translateX(0) rotate(0deg); }
+                              to { transform: translateX(800px) rotate(360deg); } }
+        </style></head>
+        <body>
+            <script>
+                for (var i = 0; i < 12; i++) {
+                    document.write('<div class="box" style="top:' + (i * 60) + 'px; background: hsl(' + (i * 30) + ',80%,60%); animation-delay: -' + (i * 0.15) + 's"></div>');
+                }
+            </script>
+        </body></html>
+    """,
+    "canvas_video": """
+        <!DOCTYPE html>
+        <html><body style="margin: 0; background: #000;">
+            <canvas id="c" width="1024" height="768"></canvas>
+            <script>
+                // Repaints every pixel each frame, like a playing video.
+                var canvas = document.getElementById('c');
+                var ctx = canvas.getContext('2d');
+                var image = ctx.createImageData(canvas.width, canvas.height);
+                var t = 0;
+                function draw() {
+                    var data = image.data;
+                    for (var i = 0; i < data.length; i += 4) {
+                        var p = i / 4;
+                        var v = (p % canvas.width + Math.floor(p / canvas.width) + t) & 255;
+                        data[i] = v; data[i + 1] = (v * 3 + t) & 255; data[i + 2] = (255 - v) & 255; data[i + 3] = 255;
+                    }
+                    ctx.putImageData(image, 0, 0);
+                    t += 4;
+                    requestAnimationFrame(draw);
+                }
+                draw();
+            </script>
+        </body></html>
+    """,
+    "long_scroll": """
+        <!DOCTYPE html>
+        <html><body style="font-family: Arial, sans-serif; margin: 0;">
+            <script>
+                for (var i = 0; i < 1000; i++) {
+                    document.write('<div style="height: 80px; padding: 10px; background: hsl(' + (i * 7 % 360) + ',60%,85%)">Row ' + i + '</div>');
+                }
+            </script>
+        </body></html>
+    """,
+}
+
+# Pages that need input while being measured.
+SCROLLING_PAGES = {"long_scroll"}
+
+class BenchBrowser(r.WebBrowser):
+    def __init__(self, server_port):
+        self.samples = []
+        super().__init__(server_port=server_port, home_url="about:blank")
+        # Nothing streams during a run, so count as a reader for the whole
+        # run; otherwise update_stream skips capture and there is nothing to time.
+        self.frame_buffer.attach()
+
+    def record_frame_timings(self, frame):
+        super().record_frame_timings(frame)
+        timings = frame.timings
+        self.samples.append((
+            frame.timestamp,
+            (timings['grab_end'] - timings['grab_start']) * 1000,
+            (timings['encode_end'] - timings['grab_end']) * 1000,
+            len(frame.data),
+        ))
+
+def process_tree_cpu_seconds():
+    # Chromium renders in child processes, so sum user+system time for this
+    # process and all of its descendants. Falls back to this process only
+    # where /proc is unavailable.
+    if not os.path.isdir("/proc"):
+        times = os.times()
+        return times.user + times.system
+    ticks = os.sysconf("SC_CLK_TCK")
+    parents = {}
+    cpu = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        parents[int(entry)] = int(fields[1])
+        cpu[int(entry)] = (int(fields[11]) + int(fields[12])) / ticks
+    tree = {os.getpid()}
+    changed = True
+    while changed:
+        changed = False
+        for pid, parent in parents.items():
+            if parent in tree and pid not in tree:
+                tree.add(pid)
+                changed = True
+    return sum(cpu.get(pid, 0.0) for pid in tree)
+
+def wait(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec_()
+
+def load_and_wait(browser, url, timeout_ms=15000):
+    view = browser.get_current_browser()
+    loop = QEventLoop()
+    view.page().loadFinished.connect(loop.quit)
+    QTimer.singleShot(timeout_ms, loop.quit)
+    browser.load_url(url)
+    loop.exec_()
+    view.page().loadFinished.disconnect(loop.quit)
+
+def measure(browser, page_name, duration, scroll):
+    browser.samples = []
+    scroll_timer = None
+    if scroll:
+        scroll_timer = QTimer()
+        scroll_timer.timeout.connect(lambda: browser.handle_scroll("down", 120))
+        scroll_timer.start(100)
+    wall_start = time.time()
+    cpu_start = process_tree_cpu_seconds()
+    wait(int(duration * 1000))
+    cpu_used = process_tree_cpu_seconds() - cpu_start
+    elapsed = time.time() - wall_start
+    if scroll_timer:
+        scroll_timer.stop()
+
+    samples = browser.samples
+    grab_ms = [sample[1] for sample in samples]
+    encode_ms = [sample[2] for sample in samples]
+    frame_bytes = [sample[3] for sample in samples]
+    return {
+        "page": page_name,
+        "frames": len(samples),
+        "duration_s": round(elapsed, 3),
+        "capture_fps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "grab_ms_mean": round(sum(grab_ms) / len(grab_ms), 3) if grab_ms else 0.0,
+        "encode_ms_mean": round(sum(encode_ms) / len(encode_ms), 3) if encode_ms else 0.0,
+        "encode_ms_p95": round(percentile(encode_ms, 0.95), 3),
+        "bytes_per_frame_mean": int(sum(frame_bytes) / len(frame_bytes)) if frame_bytes else 0,
+        "cpu_percent": round(100.0 * cpu_used / elapsed, 1) if elapsed else 0.0,
+    }
+
+def write_fixtures(directory):
+    for name, html in FIXTURE_PAGES.items():
+        with open(os.path.join(directory, f"{name}.html"), "w") as f:
+            f.write(html)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline streaming benchmark for r.py")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per page and mode")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds to settle after each load")
+    parser.add_argument("--modes", default=",".join(STREAM_MODES), help="comma-separated streaming modes")
+    parser.add_argument("--pages", default=",".join(FIXTURE_PAGES), help="comma-separated fixture pages")
+    parser.add_argument("--http", action="store_true", help="serve fixtures over local HTTP instead of file://")
+    parser.add_argument("--port", type=int, default=8765, help="port for the browser's own stream server")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    pages = [page for page in args.pages.split(",") if page]
+    for mode in modes:
+        if mode not in STREAM_MODES:
+            parser.error(f"unknown mode {mode}; choose from {', '.join(STREAM_MODES)}")
+    for page in pages:
+        if page not in FIXTURE_PAGES:
+            parser.error(f"unknown page {page}; choose from {', '.join(FIXTURE_PAGES)}")
+
+    fixture_dir = tempfile.mkdtemp(prefix="brow-bench-")
+    write_fixtures(fixture_dir)
+    fixture_server = None
+    if args.http:
+        fixture_server = start_fixture_server(functools.partial(QuietDirectoryHandler, directory=fixture_dir))
+
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    app = QApplication(sys.argv)
+    browser = BenchBrowser(args.port)
+
+    results = []
+    for page in pages:
+        if fixture_server:
+            url = f"http://127.0.0.1:{fixture_server.server_address[1]}/{page}.html"
+        else:
+            url = QUrl.fromLocalFile(os.path.join(fixture_dir, f"{page}.html")).toString()
+        for mode in modes:
+            browser.stream_format, browser.stream_quality = STREAM_MODES[mode]
+            load_and_wait(browser, url)
+            wait(int(args.warmup * 1000))
+            result = measure(browser, page, args.duration, page in SCROLLING_PAGES)
+            result["mode"] = mode
+            results.append(result)
+            print(f"{page:>14} {mode:>9}: {result['capture_fps']:6.1f} fps, "
+                  f"encode {result['encode_ms_mean']:6.2f} ms, "
+                  f"{result['bytes_per_frame_mean']:8d} B/frame, "
+                  f"cpu {result['cpu_percent']:5.1f}%", file=sys.stderr)
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "transport": "http" if args.http else "file",
+        "stream_interval_ms": browser.stream_interval,
+        "results": results,
+    }
+    if fixture_server:
+        fixture_server.shutdown()
+    browser.server.shutdown()
+    app.quit()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
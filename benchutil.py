@@ -0,0 +1,58 @@
+import threading
+import http.server
+import socketserver
+
+# Shared by bench.py, loadtest.py and latency.py.
+
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    # Serves the same page for every GET; html_fixture() makes one per page.
+    html = ""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = self.html.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class QuietDirectoryHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def html_fixture(html):
+    return type('FixtureHandler', (FixtureHandler,), {'html': html})
+
+def start_fixture_server(handler, host="127.0.0.1"):
+    # Loopback by default; only bind wider when the browser under test runs
+    # on another machine.
+    server = ThreadedTCPServer((host, 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def percentiles(values):
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'min': round(ordered[0], 3),
+        'p50': round(percentile(ordered, 0.50), 3),
+        'p90': round(percentile(ordered, 0.90), 3),
+        'p95': round(percentile(ordered, 0.95), 3),
+        'p99': round(percentile(ordered, 0.99), 3),
+        'max': round(ordered[-1], 3),
+        'mean': round(sum(ordered) / len(ordered), 3),
+    }
@@ -0,0 +1,255 @@
+import os
+import sys
+import errno
+import struct
+import argparse
+import threading
+import subprocess
+import http.server
+import socketserver
+import urllib.parse
+from multiprocessing import shared_memory, resource_tracker
+
+socketserver.TCPServer.allow_reuse_address = True
+
+# Segment layout: one ring header followed by fixed-size slots. Each slot is a
+# slot header plus room for one encoded frame. Frame `n` lives in slot
+# n % slot_count, so readers find a frame from its sequence number alone.
+RING_HEADER = struct.Struct('<4sIIQ')   # magic, slot_count, slot_size, latest sequence
+SLOT_HEADER = struct.Struct('<QdII')    # sequence, timestamp, length, content type
+MAGIC = b'FRNG'
+CONTENT_TYPES = ('image/jpeg', 'image/png')
+
+class SharedFrameRing:
+    # Single-writer ring of encoded frames in POSIX shared memory. The writer
+    # zeroes a slot's sequence before overwriting it and stores the new
+    # sequence last, so a reader that sees the same sequence before and after
+    # using a slot knows the bytes were not replaced underneath it.
+    def __init__(self, name=None, slot_count=8, slot_size=4 * 1024 * 1024, create=False):
+        if create:
+            size = RING_HEADER.size + slot_count * (SLOT_HEADER.size + slot_size)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            RING_HEADER.pack_into(self.shm.buf, 0, MAGIC, slot_count, slot_size, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Python < 3.13 registers attached segments too and would unlink
+            # the writer's segment when this reader exits.
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+            magic, slot_count, slot_size, _ = RING_HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{name} is not a frame ring")
+        self.name = self.shm.name
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.owner = create
+        self.next_sequence = 1
+        self.dropped = 0
+
+    def slot_offset(self, sequence):
+        return RING_HEADER.size + (sequence % self.slot_count) * (SLOT_HEADER.size + self.slot_size)
+
+    def publish(self, data, timestamp, content_type='image/jpeg'):
+        if len(data) > self.slot_size:
+            self.dropped += 1
+            return None
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        offset = self.slot_offset(sequence)
+        buf = self.shm.buf
+        SLOT_HEADER.pack_into(buf, offset, 0, 0.0, 0, 0)
+        start = offset + SLOT_HEADER.size
+        buf[start:start + len(data)] = data
+        SLOT_HEADER.pack_into(buf, offset, sequence, timestamp, len(data), CONTENT_TYPES.index(content_type))
+        struct.pack_into('<Q', buf, RING_HEADER.size - 8, sequence)
+        return sequence
+
+    def latest_sequence(self):
+        return struct.unpack_from('<Q', self.shm.buf, RING_HEADER.size - 8)[0]
+
+    def frame(self, sequence):
+        # Returns (timestamp, content_type, view) for a frame still in the
+        # ring, or None once it has been overwritten. The view points straight
+        # into shared memory; call is_current() after using it.
+        offset = self.slot_offset(sequence)
+        stored, timestamp, length, content_type = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        if stored != sequence:
+            return None
+        start = offset + SLOT_HEADER.size
+        return timestamp, CONTENT_TYPES[content_type], self.shm.buf[start:start + length]
+
+    def is_current(self, sequence):
+        return struct.unpack_from('<Q', self.shm.buf, self.slot_offset(sequence))[0] == sequence
+
+    def read(self, sequence):
+        # Copies a frame out of the ring: (timestamp, content_type, bytes), or
+        # None if it was overwritten before or while it was being copied.
+        frame = self.frame(sequence)
+        if frame is None:
+            return None
+        timestamp, content_type, view = frame
+        try:
+            data = bytes(view)
+        finally:
+            view.release()
+        if not self.is_current(sequence):
+            return None
+        return timestamp, content_type, data
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class FrameNotifier:
+    # Writer side of the notification pipe: one byte per published frame.
+    # Readers only need to know that *something* changed, so a full pipe
+    # (a stalled reader) is ignored instead of blocking the GUI thread.
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.write_fd, False)
+
+    def notify(self):
+        try:
+            os.write(self.write_fd, b'\0')
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.write_fd)
+
+class RingFollower:
+    # Reader side. One thread drains the notification pipe and wakes the HTTP
+    # handler threads through a local condition, so the writer pays one
+    # write() per frame however many clients are connected.
+    def __init__(self, ring, notify_fd):
+        self.ring = ring
+        self.notify_fd = notify_fd
+        self.condition = threading.Condition()
+        self.latest = ring.latest_sequence()
+        self.closed = False
+        threading.Thread(target=self.follow, daemon=True).start()
+
+    def follow(self):
+        while True:
+            try:
+                signal = os.read(self.notify_fd, 4096)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                signal = b''
+            with self.condition:
+                if not signal:
+                    # Writer exited.
+                    self.closed = True
+                else:
+                    self.latest = self.ring.latest_sequence()
+                self.condition.notify_all()
+            if not signal:
+                return
+
+    def wait_for_newer(self, sequence, timeout=None):
+        with self.condition:
+            if sequence is None:
+                sequence = self.latest - 1 if self.latest else 0
+            self.condition.wait_for(lambda: self.latest > sequence or self.closed, timeout)
+            return self.latest if self.latest > sequence else None
+
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
+class FrameHandler(http.server.BaseHTTPRequestHandler):
+    follower = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def write_frame_part(self, sequence, skipped):
+        # The frame is copied out and verified before anything is sent, so a
+        # slow client never gets a frame the writer replaced mid-send.
+        # Returns False if it was overwritten.
+        frame = self.follower.ring.read(sequence)
+        if frame is None:
+            return False
+        timestamp, content_type, data = frame
+        self.wfile.write(b'--frame\r\n')
+        self.wfile.write(f'Content-Type: {content_type}\r\n'.encode())
+        self.wfile.write(f'Content-Length: {len(data)}\r\n'.encode())
+        self.wfile.write(f'X-Frame-Sequence: {sequence}\r\n'.encode())
+        self.wfile.write(f'X-Frame-Timestamp: {timestamp:.6f}\r\n'.encode())
+        self.wfile.write(f'X-Frames-Skipped: {skipped}\r\n\r\n'.encode())
+        self.wfile.write(data)
+        self.wfile.write(b'\r\n')
+        return True
+
+    def do_GET(self):
+        if self.path == '/stream':
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.end_headers()
+            last_sequence = None
+            try:
+                while not self.follower.closed:
+                    sequence = self.follower.wait_for_newer(last_sequence, timeout=1.0)
+                    if sequence is None:
+                        continue
+                    skipped = 0 if last_sequence is None else sequence - last_sequence - 1
+                    # An overwritten frame is dropped and counted in the next skip.
+                    if self.write_frame_part(sequence, skipped):
+                        last_sequence = sequence
+            except Exception as e:
+                print(f"Stream closed: {e}")
+        elif self.path == '/frame' or self.path.startswith('/frame?'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            after = params.get('after', [None])[0]
+            if after is None:
+                sequence = self.follower.latest or None
+            elif not after.lstrip('-').isdigit():
+                self.send_error(400, 'after must be an integer')
+                return
+            else:
+                sequence = self.follower.wait_for_newer(int(after), timeout=5.0)
+            frame = self.follower.ring.read(sequence) if sequence else None
+            if frame is None:
+                self.send_response(204)
+                self.end_headers()
+                return
+            timestamp, content_type, data = frame
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('X-Frame-Sequence', str(sequence))
+            self.send_header('X-Frame-Timestamp', f'{timestamp:.6f}')
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_error(404)
+
+def spawn_frame_server(ring, notifier, port, host=""):
+    # Runs this module as a separate process that serves the ring over HTTP.
+    script = os.path.abspath(__file__)
+    process = subprocess.Popen(
+        [sys.executable, script, '--ring', ring.name, '--notify-fd', str(notifier.read_fd),
+         '--port', str(port), '--host', host],
+        pass_fds=(notifier.read_fd,))
+    os.close(notifier.read_fd)
+    return process
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve frames from a shared-memory ring written by r.py")
+    parser.add_argument("--ring", required=True, help="shared memory segment name")
+    parser.add_argument("--notify-fd", type=int, required=True, help="read end of the notification pipe")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--host", default="")
+    args = parser.parse_args()
+
+    ring = SharedFrameRing(args.ring)
+    FrameHandler.follower = RingFollower(ring, args.notify_fd)
+    server = ThreadedTCPServer((args.host, args.port), FrameHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Frame server running at http://localhost:{args.port}")
+    with FrameHandler.follower.condition:
+        FrameHandler.follower.condition.wait_for(lambda: FrameHandler.follower.closed)
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,15 @@ import http.server
 import socketserver
 import queue
 import urllib.parse
+import html
 from datetime import datetime
-from PyQt5.QtCore import QUrl, Qt, QTimer
+from PyQt5.QtCore import QUrl, Qt, QTimer, QBuffer
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QToolBar, 
                              QLineEdit, QPushButton, QAction, QVBoxLayout, 
                              QWidget, QTabWidget, QStatusBar, QMessageBox)
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtGui import QKeySequence, QPixmap
+from screenshotstore import ScreenshotStore
 
 class WebBrowser(QMainWindow):
     
@@ -27,6 +29,10 @@ class WebBrowser(QMainWindow):
         self.screenshot_dir = os.path.join(os.getcwd(), "screenshots")
         if not os.path.exists(self.screenshot_dir):
             os.makedirs(self.screenshot_dir)
+        # Identical screenshots share one blob; keep at most 512 MB and 30 days.
+        self.screenshot_store = ScreenshotStore(self.screenshot_dir, max_bytes=512 * 1024 * 1024,
+                                                max_age=30 * 24 * 3600)
+        threading.Thread(target=self.screenshot_store.import_legacy, args=(self.screenshot_dir,), daemon=True).start()
             
         self.command_queue = queue.Queue()
         self.command_timer = QTimer(self)
@@ -183,29 +189,27 @@ class WebBrowser(QMainWindow):
             self.status_bar.showMessage("Done", 2000)
             
     def take_screenshot(self):
-        current_browser = self.get_current_browser()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        url_part = current_browser.url().host().replace(".", "_") or "homepage"
-        filename = f"screenshot_{url_part}_{timestamp}.png"
-        filepath = os.path.join(self.screenshot_dir, filename)
-        
-        QTimer.singleShot(500, lambda: self._capture_screenshot(filepath))
+        QTimer.singleShot(500, self._capture_screenshot)
         
-    def _capture_screenshot(self, filepath):
+    def _capture_screenshot(self):
         current_tab = self.tabs.currentWidget()
         pixmap = current_tab.grab()
-        pixmap.save(filepath)
-        self.status_bar.showMessage(f"Screenshot saved: {filepath}", 3000)
+        buffer = QBuffer()
+        buffer.open(QBuffer.ReadWrite)
+        pixmap.save(buffer, "PNG")
+        url = self.get_current_browser().url().toString()
+        blob_name = self.screenshot_store.blob_name(self.screenshot_store.add(bytes(buffer.data()), url))
+        self.status_bar.showMessage(f"Screenshot saved: {blob_name}", 3000)
         self.update_screenshot_index()
         QMessageBox.information(
             self, 
             "Screenshot Captured",
-            f"Screenshot saved and available at:\nhttp://localhost:{self.server_port}/{os.path.basename(filepath)}"
+            f"Screenshot saved and available at:\nhttp://localhost:{self.server_port}/{blob_name}"
         )
         
-    def update_screenshot_index(self):
-        screenshots = [f for f in os.listdir(self.screenshot_dir) if f.endswith('.png') and f != "live_view.png"]
-        screenshots.sort(reverse=True)
+    def update_screenshot_index(self, limit=200):
+        # Most recent captures from the store's manifest; older ones stay reachable by blob path.
+        screenshots = self.screenshot_store.page(1, limit)
         
         html_content = """
         <!DOCTYPE html>
@@ -250,14 +254,12 @@ class WebBrowser(QMainWindow):
             <h1>Browser Screenshots</h1>
             <a href="live_view.html" class="live-view-link">View Live Stream (Auto-updating every 100ms)</a>
         """
-        for screenshot in screenshots:
-            timestamp_str = screenshot.split('_')[-1].split('.')[0]
-            date_str = screenshot.split('_')[-2]
-            formatted_time = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]} {timestamp_str[:2]}:{timestamp_str[2:4]}:{timestamp_str[4:]}"
+        for blob_name, url, captured_at in screenshots:
+            formatted_time = datetime.fromtimestamp(captured_at).strftime("%Y-%m-%d %H:%M:%S")
             html_content += f"""
             <div class="screenshot">
-                <div class="timestamp">Captured: {formatted_time}</div>
-                <img src="{screenshot}" alt="Screenshot {screenshot}">
+                <div class="timestamp">Captured: {formatted_time} {html.escape(url or '')}</div>
+                <img src="{blob_name}" alt="Screenshot {blob_name}">
             </div>
             """
         html_content += "</body></html>"
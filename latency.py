@@ -0,0 +1,222 @@
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+
+from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtGui import QImage
+
+from benchutil import html_fixture, start_fixture_server, percentiles
+
+# The whole page flips between two marker colours on every mousedown or
+# keydown, so any pixel of a frame tells us whether the input has landed.
+FIXTURE_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>html, body { margin: 0; height: 100%; overflow: hidden; background: #ff0000; }</style>
+    <script>
+        var markers = ['#ff0000', '#0000ff'];
+        var index = 0;
+        function flip() {
+            index = 1 - index;
+            document.body.style.background = markers[index];
+        }
+        document.addEventListener('mousedown', flip);
+        document.addEventListener('keydown', flip);
+    </script>
+</head>
+<body></body>
+</html>
+"""
+
+TRANSPORTS = ('mjpeg', 'sse', 'polling')
+PATHS = ('js', 'native')
+INPUTS = ('click', 'type')
+
+def marker_color(data):
+    # JPEG noise means exact matches are unreliable; classify the centre pixel.
+    image = QImage.fromData(data)
+    if image.isNull():
+        return None
+    pixel = image.pixel(image.width() // 2, image.height() // 2)
+    red, green, blue = (pixel >> 16) & 0xff, (pixel >> 8) & 0xff, pixel & 0xff
+    if red > 180 and green < 80 and blue < 80:
+        return 'red'
+    if blue > 180 and red < 80 and green < 80:
+        return 'blue'
+    return None
+
+class FrameWatcher(threading.Thread):
+    # Reads frames over one transport and publishes the marker colour of the
+    # most recent frame together with its arrival time.
+    def __init__(self, host, port, transport):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.stop_event = threading.Event()
+        self.condition = threading.Condition()
+        self.color = None
+        self.arrival = 0.0
+        self.error = None
+
+    def frame_arrived(self, data):
+        arrived = time.time()
+        color = marker_color(data)
+        with self.condition:
+            self.color = color
+            self.arrival = arrived
+            self.condition.notify_all()
+
+    def wait_for_color(self, color, after, timeout):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.color == color and self.arrival > after, timeout):
+                return None
+            return self.arrival
+
+    def current_color(self, timeout=5.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.color is not None, timeout)
+            return self.color
+
+    def run(self):
+        try:
+            getattr(self, f'read_{self.transport}')()
+        except Exception as e:
+            self.error = str(e)
+
+    def read_mjpeg(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        connection.request('GET', '/stream')
+        response = connection.getresponse()
+        while not self.stop_event.is_set():
+            line = response.readline()
+            if not line:
+                break
+            if not line.startswith(b'--frame'):
+                continue
+            length = 0
+            while True:
+                header = response.readline().strip()
+                if not header:
+                    break
+                name, _, value = header.decode().partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            data = response.read(length)
+            response.readline()
+            self.frame_arrived(data)
+        connection.close()
+
+    def read_sse(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=20)
+        connection.request('GET', '/events')
+        response = connection.getresponse()
+        while not self.stop_event.is_set():
+            line = response.readline()
+            if not line:
+                break
+            if line.startswith(b'data: '):
+                payload = line[len(b'data: '):].strip().split(b';', 2)[2]
+                self.frame_arrived(base64.b64decode(payload))
+        connection.close()
+
+    def read_polling(self):
+        after = None
+        while not self.stop_event.is_set():
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+            connection.request('GET', '/frame' if after is None else f'/frame?after={after}')
+            response = connection.getresponse()
+            data = response.read()
+            if response.status == 200:
+                after = response.getheader('X-Frame-Sequence')
+                self.frame_arrived(data)
+            connection.close()
+
+def send_input(base_url, kind, path):
+    if kind == 'click':
+        url = f'{base_url}/click?x=200&y=200&mode={path}'
+    else:
+        modifiers = urllib.parse.quote(json.dumps({'ctrl': False, 'shift': False, 'alt': False}))
+        url = f'{base_url}/type?key=x&modifiers={modifiers}&mode={path}'
+    urllib.request.urlopen(url, timeout=10).read()
+
+def run_probes(base_url, watcher, kind, path, samples, interval, timeout):
+    latencies = []
+    timeouts = 0
+    for _ in range(samples):
+        before = watcher.current_color()
+        if before is None:
+            timeouts += 1
+            continue
+        expected = 'blue' if before == 'red' else 'red'
+        sent = time.time()
+        send_input(base_url, kind, path)
+        arrival = watcher.wait_for_color(expected, sent, timeout)
+        if arrival is None:
+            timeouts += 1
+        else:
+            latencies.append((arrival - sent) * 1000)
+        time.sleep(interval)
+    return latencies, timeouts
+
+def main():
+    parser = argparse.ArgumentParser(description="Input-to-photon latency probe for the r.py stream server")
+    parser.add_argument("--server", default="http://localhost:8000", help="base URL of the browser server")
+    parser.add_argument("--samples", type=int, default=30, help="probes per input, path and transport")
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between probes")
+    parser.add_argument("--timeout", type=float, default=3.0, help="seconds to wait for the marker")
+    parser.add_argument("--transports", default=",".join(TRANSPORTS))
+    parser.add_argument("--paths", default=",".join(PATHS))
+    parser.add_argument("--inputs", default=",".join(INPUTS))
+    parser.add_argument("--fixture-host", default="localhost",
+                        help="host name the browser uses to reach this machine's fixture page")
+    parser.add_argument("--fixture-bind", default="127.0.0.1",
+                        help="address the fixture server listens on (widen it for a remote browser)")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)  # lets QImage find its JPEG plugin
+    base_url = args.server.rstrip('/')
+    parsed = urllib.parse.urlparse(base_url)
+    host, port = parsed.hostname, parsed.port or 80
+
+    fixture_server = start_fixture_server(html_fixture(FIXTURE_HTML), args.fixture_bind)
+    fixture_url = f"http://{args.fixture_host}:{fixture_server.server_address[1]}/"
+    urllib.request.urlopen(f"{base_url}/navigate?url={urllib.parse.quote(fixture_url)}", timeout=10).read()
+    time.sleep(2.0)
+
+    results = []
+    for transport in args.transports.split(","):
+        watcher = FrameWatcher(host, port, transport)
+        watcher.start()
+        for path in args.paths.split(","):
+            for kind in args.inputs.split(","):
+                latencies, timeouts = run_probes(base_url, watcher, kind, path,
+                                                 args.samples, args.interval, args.timeout)
+                result = {'transport': transport, 'path': path, 'input': kind,
+                          'timeouts': timeouts, 'latency_ms': percentiles(latencies)}
+                results.append(result)
+                summary = result['latency_ms']
+                print(f"{transport:>8} {path:>6} {kind:>5}: p50 {summary.get('p50', '-')} ms, "
+                      f"p99 {summary.get('p99', '-')} ms, {timeouts} timeouts", file=sys.stderr)
+        watcher.stop_event.set()
+        if watcher.error:
+            print(f"{transport} reader stopped: {watcher.error}", file=sys.stderr)
+
+    fixture_server.shutdown()
+    output = json.dumps({'server': base_url, 'timestamp': time.time(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QToolBar,
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtGui import QKeySequence, QImage
 import base64
+from viewpool import ViewPool
 
 class WebBrowser(QMainWindow):
     
@@ -57,6 +58,8 @@ class WebBrowser(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         
+        self.view_pool = ViewPool(self.create_tab_widget, size=2,
+                                  is_idle=lambda: self.command_queue.empty())
         self.add_new_tab()
         self.setCentralWidget(self.tabs)
         
@@ -111,11 +114,8 @@ class WebBrowser(QMainWindow):
         go_button.clicked.connect(self.navigate_to_url)
         navigation_bar.addWidget(go_button)
     
-    def add_new_tab(self, url=None):
+    def create_tab_widget(self):
         browser = QWebEngineView()
-        browser.page().loadProgress.connect(self.update_loading_progress)
-        browser.page().loadFinished.connect(self.update_url)
-        browser.page().titleChanged.connect(self.update_title)
         
         layout = QVBoxLayout()
         layout.addWidget(browser)
@@ -123,6 +123,13 @@ class WebBrowser(QMainWindow):
         
         tab = QWidget()
         tab.setLayout(layout)
+        return tab, browser
+    
+    def add_new_tab(self, url=None):
+        (tab, browser), _ = self.view_pool.take()
+        browser.page().loadProgress.connect(self.update_loading_progress)
+        browser.page().loadFinished.connect(self.update_url)
+        browser.page().titleChanged.connect(self.update_title)
         
         index = self.tabs.addTab(tab, "New Tab")
         self.tabs.setCurrentIndex(index)
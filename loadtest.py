@@ -0,0 +1,275 @@
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+
+from benchutil import html_fixture, start_fixture_server, percentiles
+
+# Fixture page for input round-trip probes. Only a click inside the probe box
+# or the 'p' key repaints anything; storm inputs land elsewhere and the page
+# cannot scroll, so an unchanged frame really means "input not yet visible".
+FIXTURE_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        html, body { margin: 0; height: 100%; overflow: hidden; background: #ffffff; }
+        #probe { position: absolute; left: 0; top: 0; width: 200px; height: 200px; background: #000000; }
+    </style>
+    <script>
+        var colors = ['#000000', '#ff0000', '#00ff00', '#0000ff'];
+        var index = 0;
+        function flip() {
+            index = (index + 1) % colors.length;
+            document.getElementById('probe').style.background = colors[index];
+        }
+        document.addEventListener('click', function(event) {
+            if (event.target.id === 'probe') { flip(); }
+        });
+        document.addEventListener('keydown', function(event) {
+            if (event.key === 'p') { flip(); }
+        });
+    </script>
+</head>
+<body><div id="probe"></div></body>
+</html>
+"""
+
+PROBE_CLICK = (100, 100)
+STORM_KEYS = "abcdefghijklmnoqrstuvwxyz"
+
+class StreamViewer(threading.Thread):
+    # One /stream subscriber. Parses the multipart response using the
+    # Content-Length r.py sends with every part.
+    def __init__(self, host, port, stop_event, on_frame=None):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.stop_event = stop_event
+        self.on_frame = on_frame
+        self.arrivals = []
+        self.skipped = 0
+        self.bytes_received = 0
+        self.frames = 0
+        self.error = None
+        self.connected_at = None
+
+    def run(self):
+        try:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+            connection.request('GET', '/stream')
+            response = connection.getresponse()
+            self.connected_at = time.time()
+            while not self.stop_event.is_set():
+                line = response.readline()
+                if not line:
+                    break
+                if not line.startswith(b'--frame'):
+                    continue
+                headers = {}
+                while True:
+                    header = response.readline().strip()
+                    if not header:
+                        break
+                    name, _, value = header.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                data = response.read(int(headers.get('content-length', 0)))
+                response.readline()
+                arrived = time.time()
+                self.arrivals.append(arrived)
+                self.frames += 1
+                self.bytes_received += len(data)
+                self.skipped += int(headers.get('x-frames-skipped', 0))
+                if self.on_frame:
+                    self.on_frame(data, arrived)
+            connection.close()
+        except Exception as e:
+            self.error = str(e)
+
+    def report(self, elapsed):
+        gaps = [(b - a) * 1000 for a, b in zip(self.arrivals, self.arrivals[1:])]
+        return {
+            'frames': self.frames,
+            'frames_skipped_by_server': self.skipped,
+            'fps': round(self.frames / elapsed, 2) if elapsed else 0.0,
+            'throughput_kbps': round(self.bytes_received * 8 / 1000 / elapsed, 1) if elapsed else 0.0,
+            'inter_arrival_ms': percentiles(gaps),
+            'error': self.error,
+        }
+
+class InputStorm(threading.Thread):
+    # Fires one kind of input at a fixed average rate (Poisson arrivals) and
+    # records how long the server took to accept each request.
+    def __init__(self, base_url, kind, rate, stop_event):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.kind = kind
+        self.rate = rate
+        self.stop_event = stop_event
+        self.latencies = []
+        self.errors = 0
+
+    def next_path(self):
+        if self.kind == 'click':
+            # Anywhere outside the probe box.
+            return f'/click?x={random.randint(300, 1000)}&y={random.randint(300, 700)}'
+        if self.kind == 'scroll':
+            return f'/scroll?direction={random.choice(["up", "down"])}&amount={random.randint(50, 300)}'
+        key = random.choice(STORM_KEYS)
+        modifiers = json.dumps({'ctrl': False, 'shift': False, 'alt': False})
+        return f'/type?key={key}&modifiers={urllib.parse.quote(modifiers)}'
+
+    def run(self):
+        while not self.stop_event.wait(random.expovariate(self.rate)):
+            start = time.time()
+            try:
+                urllib.request.urlopen(self.base_url + self.next_path(), timeout=10).read()
+                self.latencies.append((time.time() - start) * 1000)
+            except Exception:
+                self.errors += 1
+
+class RoundTripProbe(threading.Thread):
+    # Sends one probe input at a time and waits until a frame whose bytes
+    # differ from the pre-input frame arrives on its own /stream connection.
+    def __init__(self, base_url, host, port, interval, stop_event, timeout=5.0):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.interval = interval
+        self.stop_event = stop_event
+        self.timeout = timeout
+        self.round_trips = {'click': [], 'type': []}
+        self.timeouts = 0
+        self.condition = threading.Condition()
+        self.latest_digest = None
+        self.latest_arrival = 0.0
+        self.viewer = StreamViewer(host, port, stop_event, on_frame=self.frame_arrived)
+
+    def frame_arrived(self, data, arrived):
+        digest = hashlib.sha1(data).digest()
+        with self.condition:
+            self.latest_digest = digest
+            self.latest_arrival = arrived
+            self.condition.notify_all()
+
+    def probe(self, kind):
+        with self.condition:
+            baseline = self.latest_digest
+        if kind == 'click':
+            path = f'/click?x={PROBE_CLICK[0]}&y={PROBE_CLICK[1]}'
+        else:
+            modifiers = json.dumps({'ctrl': False, 'shift': False, 'alt': False})
+            path = f'/type?key=p&modifiers={urllib.parse.quote(modifiers)}'
+        sent = time.time()
+        urllib.request.urlopen(self.base_url + path, timeout=10).read()
+        with self.condition:
+            changed = self.condition.wait_for(
+                lambda: self.latest_digest != baseline and self.latest_arrival > sent, self.timeout)
+            arrival = self.latest_arrival
+        if changed:
+            self.round_trips[kind].append((arrival - sent) * 1000)
+        else:
+            self.timeouts += 1
+
+    def run(self):
+        self.viewer.start()
+        # Let a few identical frames arrive so the baseline is stable.
+        self.stop_event.wait(1.0)
+        kinds = ['click', 'type']
+        turn = 0
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.probe(kinds[turn % len(kinds)])
+            except Exception:
+                self.timeouts += 1
+            turn += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the r.py stream server")
+    parser.add_argument("--server", default="http://localhost:8000", help="base URL of the browser server")
+    parser.add_argument("--viewers", type=int, default=10, help="concurrent /stream subscriptions")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--click-rate", type=float, default=5.0, help="synthetic /click requests per second")
+    parser.add_argument("--scroll-rate", type=float, default=5.0, help="synthetic /scroll requests per second")
+    parser.add_argument("--type-rate", type=float, default=10.0, help="synthetic /type requests per second")
+    parser.add_argument("--probe-interval", type=float, default=1.0, help="seconds between round-trip probes")
+    parser.add_argument("--fixture-host", default="localhost",
+                        help="host name the browser uses to reach this machine's fixture page")
+    parser.add_argument("--fixture-bind", default="127.0.0.1",
+                        help="address the fixture server listens on (widen it for a remote browser)")
+    parser.add_argument("--no-fixture", action="store_true",
+                        help="do not navigate the browser to the probe page (disables round-trip probes)")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    base_url = args.server.rstrip('/')
+    parsed = urllib.parse.urlparse(base_url)
+    host, port = parsed.hostname, parsed.port or 80
+    stop_event = threading.Event()
+
+    fixture_server = None
+    if not args.no_fixture:
+        fixture_server = start_fixture_server(html_fixture(FIXTURE_HTML), args.fixture_bind)
+        fixture_url = f"http://{args.fixture_host}:{fixture_server.server_address[1]}/"
+        urllib.request.urlopen(f"{base_url}/navigate?url={urllib.parse.quote(fixture_url)}", timeout=10).read()
+        time.sleep(2.0)
+
+    viewers = [StreamViewer(host, port, stop_event) for _ in range(args.viewers)]
+    storms = [
+        InputStorm(base_url, kind, rate, stop_event)
+        for kind, rate in (('click', args.click_rate), ('scroll', args.scroll_rate), ('type', args.type_rate))
+        if rate > 0
+    ]
+    probe = None
+    if fixture_server:
+        probe = RoundTripProbe(base_url, host, port, args.probe_interval, stop_event)
+
+    start = time.time()
+    for thread in viewers + storms + ([probe] if probe else []):
+        thread.start()
+    try:
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    stop_event.set()
+    elapsed = time.time() - start
+
+    viewer_reports = [viewer.report(elapsed) for viewer in viewers]
+    all_gaps = []
+    for viewer in viewers:
+        all_gaps.extend((b - a) * 1000 for a, b in zip(viewer.arrivals, viewer.arrivals[1:]))
+    report = {
+        'server': base_url,
+        'viewers': args.viewers,
+        'duration_s': round(elapsed, 3),
+        'rates_per_s': {'click': args.click_rate, 'scroll': args.scroll_rate, 'type': args.type_rate},
+        'stream': {
+            'total_fps': round(sum(r['fps'] for r in viewer_reports), 2),
+            'total_throughput_kbps': round(sum(r['throughput_kbps'] for r in viewer_reports), 1),
+            'inter_arrival_ms': percentiles(all_gaps),
+            'disconnected': sum(1 for r in viewer_reports if r['error']),
+            'clients': viewer_reports,
+        },
+        'input_accept_ms': {
+            storm.kind: dict(percentiles(storm.latencies), errors=storm.errors) for storm in storms
+        },
+    }
+    if probe:
+        report['input_round_trip_ms'] = {kind: percentiles(values) for kind, values in probe.round_trips.items()}
+        report['input_round_trip_timeouts'] = probe.timeouts
+    if fixture_server:
+        fixture_server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
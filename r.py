@@ -8,13 +8,31 @@ import queue
 import urllib.parse
 import json
 import getpass
-from PyQt5.QtCore import QUrl, Qt, QTimer, QBuffer
+import collections
+import bisect
+import traceback
+import hmac
+import cProfile
+import marshal
+import itertools
+import contextlib
+import base64
+import math
+import ipaddress
+import atexit
+import secrets
+import subprocess
+import framering
+from viewpool import ViewPool
+from PyQt5.QtCore import QUrl, Qt, QTimer, QBuffer, QPoint, QEvent, QObject, pyqtSignal
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QToolBar, 
                              QLineEdit, QPushButton, QAction, QVBoxLayout, 
                              QWidget, QTabWidget, QStatusBar, QScrollArea)
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineProfile
-from PyQt5.QtWebEngineCore import QWebEngineHttpRequest
-from PyQt5.QtGui import QKeySequence, QPixmap, QImage
+from PyQt5.QtWebEngineWidgets import (QWebEngineView, QWebEngineProfile, QWebEnginePage,
+                                      QWebEngineSettings, QWebEngineScript)
+from PyQt5.QtWebEngineCore import (QWebEngineHttpRequest, QWebEngineUrlRequestInterceptor,
+                                   QWebEngineUrlRequestInfo)
+from PyQt5.QtGui import QKeySequence, QPixmap, QImage, QMouseEvent, QKeyEvent, QPainter, QColor
 
 # Set environment variables for headless operation
 os.environ["QT_QPA_PLATFORM"] = "offscreen"  # Use offscreen rendering
@@ -25,12 +43,611 @@ if not os.path.exists(os.environ["XDG_RUNTIME_DIR"]):
     os.makedirs(os.environ["XDG_RUNTIME_DIR"])
 socketserver.TCPServer.allow_reuse_address = True
 
+# Qt key codes for DOM key names used by native (QKeyEvent) input injection.
+NATIVE_KEYS = {
+    'Enter': Qt.Key_Return, 'Backspace': Qt.Key_Backspace, 'Tab': Qt.Key_Tab,
+    'Escape': Qt.Key_Escape, 'Delete': Qt.Key_Delete, 'ArrowLeft': Qt.Key_Left,
+    'ArrowRight': Qt.Key_Right, 'ArrowUp': Qt.Key_Up, 'ArrowDown': Qt.Key_Down,
+    'Shift': Qt.Key_Shift, 'Control': Qt.Key_Control, 'Alt': Qt.Key_Alt, ' ': Qt.Key_Space,
+}
+
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     pass
 
+class Histogram:
+    # Per-bucket (non-cumulative) counts in milliseconds; cheap enough to update
+    # from the capture loop and from every client send.
+    DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self):
+        with self.lock:
+            counts = list(self.counts)
+            count = self.count
+            total = self.total
+        return {
+            'buckets': [[bound, n] for bound, n in zip(list(self.buckets) + ['+Inf'], counts)],
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else 0.0,
+        }
+
+class Metrics:
+    # Prometheus-style registry. Updates are a dict write under a lock so the
+    # capture loop is not slowed down; all formatting happens in render().
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.types = {}
+        self.descriptions = {}
+        self.values = {}
+        self.histograms = {}
+        self.callbacks = {}
+
+    def describe(self, name, metric_type, description):
+        self.types[name] = metric_type
+        self.descriptions[name] = description
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = value
+
+    def remove(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values.pop(key, None)
+
+    def register_histogram(self, name, histogram, **labels):
+        with self.lock:
+            self.histograms[(name, tuple(sorted(labels.items())))] = histogram
+        return histogram
+
+    def register_callback(self, name, callback, **labels):
+        # Gauges sampled at scrape time, e.g. queue depth.
+        self.callbacks[(name, tuple(sorted(labels.items())))] = callback
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+            histograms = dict(self.histograms)
+        for key, callback in list(self.callbacks.items()):
+            values[key] = callback()
+
+        lines = []
+        for name in sorted({key[0] for key in values} | {key[0] for key in histograms}):
+            if name in self.descriptions:
+                lines.append(f'# HELP {name} {self.descriptions[name]}')
+            lines.append(f'# TYPE {name} {self.types.get(name, "untyped")}')
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{self.format_labels(labels)} {value}')
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                snapshot = histogram.snapshot()
+                cumulative = 0
+                for bound, count in snapshot['buckets']:
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self.format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{self.format_labels(labels)} {snapshot["sum"]}')
+                lines.append(f'{name}_count{self.format_labels(labels)} {snapshot["count"]}')
+        return '\n'.join(lines) + '\n'
+
+class Frame:
+    def __init__(self, sequence, timestamp, data, timings=None, content_type='image/jpeg'):
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.data = data
+        self.content_type = content_type
+        # Wall-clock stage timestamps: grab_start, grab_end, encode_end, publish
+        self.timings = timings or {}
+
+class FrameBuffer:
+    # Fixed-size ring of recently encoded frames. Sequence numbers increase
+    # monotonically so clients can resume after a reconnect and count drops.
+    def __init__(self, capacity=64):
+        self.frames = collections.deque(maxlen=capacity)
+        self.next_sequence = 1
+        self.closed = False
+        # Streams following the buffer and the time of the last /frame poll;
+        # the capture loop skips frames nobody would see.
+        self.readers = 0
+        self.last_polled = 0.0
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+
+    def publish(self, data, timestamp=None, timings=None, content_type='image/jpeg'):
+        with self.lock:
+            frame = Frame(self.next_sequence, timestamp or time.time(), data, timings, content_type)
+            frame.timings['publish'] = time.time()
+            self.next_sequence += 1
+            self.frames.append(frame)
+            self.condition.notify_all()
+            return frame
+
+    def latest(self):
+        with self.lock:
+            return self.frames[-1] if self.frames else None
+
+    def oldest_sequence(self):
+        with self.lock:
+            return self.frames[0].sequence if self.frames else self.next_sequence
+
+    def frames_since(self, sequence):
+        # Returns the buffered frames newer than `sequence` and how many
+        # frames in between have already been evicted from the ring.
+        with self.lock:
+            sequence = min(max(sequence, 0), self.next_sequence - 1)
+            frames = [frame for frame in self.frames if frame.sequence > sequence]
+            if frames:
+                missed = max(0, frames[0].sequence - sequence - 1)
+            else:
+                missed = max(0, self.next_sequence - sequence - 1)
+            return frames, missed
+
+    def wait_for_newer(self, sequence, timeout=None):
+        # Blocks until a frame newer than `sequence` exists and returns the
+        # newest one; None means nothing arrived before the timeout or the
+        # buffer was closed.
+        with self.lock:
+            # A sequence ahead of the ring (say, from before a restart) would
+            # never be reached; it waits for the next frame instead.
+            if sequence is None or sequence > self.next_sequence - 1:
+                sequence = self.next_sequence - 1
+            if not self.condition.wait_for(lambda: self.next_sequence - 1 > sequence or self.closed, timeout):
+                return None
+            return self.frames[-1] if self.next_sequence - 1 > sequence else None
+
+    def attach(self):
+        with self.lock:
+            self.readers += 1
+
+    def detach(self):
+        with self.lock:
+            self.readers -= 1
+
+    def poll(self):
+        self.last_polled = time.monotonic()
+
+    def in_demand(self, grace=5.0):
+        return self.readers > 0 or time.monotonic() - self.last_polled < grace
+
+    def close(self):
+        # Wakes every waiter; streams following this buffer then end.
+        with self.lock:
+            self.closed = True
+            self.condition.notify_all()
+
+class StallWatchdog:
+    # A heartbeat QTimer on the GUI thread stamps last_beat; a daemon thread
+    # notices when it stops ticking and snapshots the GUI thread's Python stack.
+    def __init__(self, threshold_ms=250, heartbeat_ms=50, history=50):
+        self.threshold_ms = threshold_ms
+        self.heartbeat_ms = heartbeat_ms
+        self.lag_histogram = Histogram()
+        self.stall_histogram = Histogram((250, 500, 1000, 2500, 5000, 10000, 30000))
+        self.stalls = collections.deque(maxlen=history)
+        self.stall_count = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.current_stall = None
+        self.last_beat = time.monotonic()
+        self.main_thread_id = threading.get_ident()
+
+    def start(self, parent):
+        # Must be called from the GUI thread.
+        self.main_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.heartbeat_timer = QTimer(parent)
+        self.heartbeat_timer.timeout.connect(self.beat)
+        self.heartbeat_timer.start(self.heartbeat_ms)
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.heartbeat_timer.stop()
+
+    def beat(self):
+        now = time.monotonic()
+        with self.lock:
+            gap_ms = (now - self.last_beat) * 1000
+            self.last_beat = now
+            stall = self.current_stall
+            self.current_stall = None
+        self.lag_histogram.observe(max(0.0, gap_ms - self.heartbeat_ms))
+        if stall is None and gap_ms < self.threshold_ms:
+            return
+        if stall is None:
+            # The watchdog thread did not get to run during the stall (GIL held).
+            stall = {'started_at': time.time() - gap_ms / 1000, 'stack': None}
+        stall['duration_ms'] = gap_ms
+        self.stall_histogram.observe(gap_ms)
+        with self.lock:
+            self.stall_count += 1
+            self.stalls.append(stall)
+
+    def watch(self):
+        while not self.stop_event.wait(self.heartbeat_ms / 1000):
+            with self.lock:
+                if self.current_stall is not None:
+                    continue
+                lag_ms = (time.monotonic() - self.last_beat) * 1000
+                if lag_ms < self.threshold_ms:
+                    continue
+                frame = sys._current_frames().get(self.main_thread_id)
+                stack = ''.join(traceback.format_stack(frame)) if frame else None
+                self.current_stall = {'started_at': time.time() - lag_ms / 1000, 'stack': stack}
+
+    def report(self):
+        with self.lock:
+            stalls = list(self.stalls)
+            stall_count = self.stall_count
+            current = self.current_stall
+        ongoing = None
+        if current is not None:
+            ongoing = dict(current, duration_ms=(time.time() - current['started_at']) * 1000)
+        return {
+            'threshold_ms': self.threshold_ms,
+            'heartbeat_ms': self.heartbeat_ms,
+            'stall_count': stall_count,
+            'ongoing': ongoing,
+            'recent': stalls,
+            'stall_ms': self.stall_histogram.snapshot(),
+            'event_loop_lag_ms': self.lag_histogram.snapshot(),
+        }
+
+class TraceBuffer:
+    # Bounded ring of Chrome trace_event records (load the dump in
+    # chrome://tracing or Perfetto). deque.append is thread-safe, so spans can
+    # be recorded from the GUI thread and handler threads without a lock.
+    def __init__(self, capacity=20000):
+        self.events = collections.deque(maxlen=capacity)
+        self.pid = os.getpid()
+        self.async_ids = itertools.count(1)
+
+    def complete(self, name, category, start, end, **args):
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': start * 1e6, 'dur': (end - start) * 1e6,
+            'pid': self.pid, 'tid': threading.get_ident(), 'args': args,
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, category, **args):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start, time.time(), **args)
+
+    def async_begin(self, name, category, **args):
+        async_id = next(self.async_ids)
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'b', 'id': async_id,
+            'ts': time.time() * 1e6, 'pid': self.pid, 'tid': threading.get_ident(), 'args': args,
+        })
+        return async_id
+
+    def async_end(self, name, category, async_id, **args):
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'e', 'id': async_id,
+            'ts': time.time() * 1e6, 'pid': self.pid, 'tid': threading.get_ident(), 'args': args,
+        })
+
+    def dump(self, clear=False):
+        events = list(self.events)
+        if clear:
+            self.events.clear()
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': thread.ident,
+             'args': {'name': thread.name}}
+            for thread in threading.enumerate()
+        ]
+        return {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+
+class SamplingProfiler:
+    # Samples the Python stacks of every thread (GUI and HTTP handlers) and
+    # aggregates them in collapsed-stack format for flamegraph tools.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lock = threading.Lock()
+
+    def profile(self, seconds):
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            own_thread = threading.get_ident()
+            counts = collections.Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    counts[';'.join(part.replace(';', ':') for part in reversed(stack))] += 1
+                time.sleep(self.interval)
+            return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+        finally:
+            self.lock.release()
+
+class DomainRuleSet:
+    # Suffix trie over reversed host labels ("ads.example.com" is stored as
+    # com -> example -> ads), so a lookup costs one dict hit per label no
+    # matter how many rules are loaded. A node may block the whole domain
+    # (and its subdomains) or only some path prefixes on it.
+    BLOCK_ALL = ''
+    # Names hosts files map to the machine itself; blocking them would break
+    # local pages rather than any tracker.
+    HOSTS_SELF_ENTRIES = frozenset((
+        'localhost', 'localhost.localdomain', 'local', 'broadcasthost', '0.0.0.0', '127.0.0.1',
+        'ip6-localhost', 'ip6-loopback', 'ip6-localnet', 'ip6-mcastprefix',
+        'ip6-allnodes', 'ip6-allrouters', 'ip6-allhosts',
+    ))
+
+    def __init__(self):
+        self.root = {}
+        self.rule_count = 0
+        # Adblock rules this matcher cannot express (options, wildcards,
+        # exceptions, cosmetic filters); skipped rather than half-applied.
+        self.unsupported = 0
+
+    @classmethod
+    def from_file(cls, path):
+        rules = cls()
+        with open(path) as f:
+            for line in f:
+                rules.add(line)
+        if rules.unsupported:
+            print(f"Skipped {rules.unsupported} unsupported rules in {path}")
+        return rules
+
+    @staticmethod
+    def is_address(value):
+        try:
+            ipaddress.ip_address(value.split('%', 1)[0])
+        except ValueError:
+            return False
+        return True
+
+    def add(self, line):
+        # Accepts "example.com", "example.com/ads/", hosts-file lines
+        # ("0.0.0.0 example.com other.com") and plain adblock domain rules
+        # ("||example.com^").
+        line = line.strip()
+        if not line or line.startswith(('!', '[')):
+            return
+        if line.startswith('@@') or any(marker in line for marker in ('##', '#@#', '#?#', '#$#')):
+            self.unsupported += 1
+            return
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            return
+        parts = line.split()
+        if len(parts) > 1:
+            if not self.is_address(parts[0]):
+                self.unsupported += 1
+                return
+            for name in parts[1:]:
+                self.add_rule(name)
+            return
+        if line.startswith('||'):
+            line = line[2:].rstrip('^')
+        if line.startswith('|') or any(marker in line for marker in ('$', '*', '^')):
+            self.unsupported += 1
+            return
+        self.add_rule(line)
+
+    def add_rule(self, rule):
+        host, slash, path = rule.partition('/')
+        host = host.lower().strip('.')
+        if not host or host in self.HOSTS_SELF_ENTRIES:
+            return
+        node = self.root
+        for label in reversed(host.split('.')):
+            node = node.setdefault(label, {})
+        paths = node.setdefault(None, set())
+        paths.add('/' + path if slash else self.BLOCK_ALL)
+        self.rule_count += 1
+
+    def match(self, host, path):
+        node = self.root
+        for label in reversed(host.lower().split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            paths = node.get(None)
+            if paths:
+                if self.BLOCK_ALL in paths:
+                    return True
+                if any(path.startswith(prefix) for prefix in paths):
+                    return True
+        return False
+
+class ContentBlocker(QWebEngineUrlRequestInterceptor):
+    # Installed on the session profile; drops sub-resource requests that
+    # match the rule set. Main-frame navigations are never blocked.
+    RESOURCE_TYPES = {
+        getattr(QWebEngineUrlRequestInfo, name): name[len('ResourceType'):].lower()
+        for name in dir(QWebEngineUrlRequestInfo) if name.startswith('ResourceType')
+    }
+
+    def __init__(self, rules=None, metrics=None, parent=None):
+        super().__init__(parent)
+        self.rules = rules or DomainRuleSet()
+        self.metrics = metrics
+        # Resource types refused outright, e.g. by low-bandwidth mode.
+        self.blocked_types = frozenset()
+        self.blocked = collections.Counter()
+        self.allowed = 0
+
+    def interceptRequest(self, info):
+        if info.resourceType() == QWebEngineUrlRequestInfo.ResourceTypeMainFrame:
+            return
+        url = info.requestUrl()
+        if info.resourceType() in self.blocked_types:
+            reason = 'low_bandwidth'
+        elif self.rules.match(url.host(), url.path()):
+            reason = 'rule'
+        else:
+            self.allowed += 1
+            return
+        info.block(True)
+        resource_type = self.RESOURCE_TYPES.get(info.resourceType(), 'unknown')
+        self.blocked[url.host()] += 1
+        if self.metrics:
+            self.metrics.inc('browser_blocked_requests_total', type=resource_type, reason=reason)
+
+    def report(self, top=20):
+        return {
+            'rules': self.rules.rule_count,
+            'unsupported_rules': self.rules.unsupported,
+            'allowed_requests': self.allowed,
+            'blocked_requests': sum(self.blocked.values()),
+            'top_blocked_hosts': self.blocked.most_common(top),
+        }
+
+class SessionProfile:
+    # Wraps a dedicated QWebEngineProfile so a session never shares cookies,
+    # storage or HTTP cache with anyone else. With no name the profile is
+    # off-the-record (memory-only); with a name it persists under storage_path.
+    def __init__(self, name=None, storage_path=None, cache_size_mb=64,
+                 cache_cap_mb=256, memory_cap_mb=None, parent=None):
+        self.cache_cap_bytes = cache_cap_mb * 1024 * 1024 if cache_cap_mb else None
+        self.memory_cap_kb = memory_cap_mb * 1024 if memory_cap_mb else None
+        self.cache_clears = 0
+        # Settings low-bandwidth mode replaced, while it is on.
+        self.saved_settings = None
+        # Kept as a plain string so the pressure check can run off the GUI thread.
+        self.cache_path = None
+        if name:
+            self.profile = QWebEngineProfile(name, parent)
+            storage_path = storage_path or os.path.join(os.getcwd(), "profiles", name)
+            self.cache_path = os.path.join(storage_path, "cache")
+            self.profile.setPersistentStoragePath(storage_path)
+            self.profile.setCachePath(self.cache_path)
+            self.profile.setHttpCacheType(QWebEngineProfile.DiskHttpCache)
+        else:
+            self.profile = QWebEngineProfile(parent)
+            self.profile.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+        self.profile.setHttpCacheMaximumSize(cache_size_mb * 1024 * 1024)
+
+    # Sub-resources refused in low-bandwidth mode.
+    LOW_BANDWIDTH_TYPES = frozenset(
+        getattr(QWebEngineUrlRequestInfo, name) for name in (
+            'ResourceTypeImage', 'ResourceTypeMedia', 'ResourceTypeFontResource',
+            'ResourceTypeFavicon', 'ResourceTypeWorker', 'ResourceTypeSharedWorker',
+            'ResourceTypeServiceWorker',
+        ) if hasattr(QWebEngineUrlRequestInfo, name))
+
+    NO_ANIMATION_CSS = "*, *::before, *::after { animation: none !important; transition: none !important; }"
+    NO_ANIMATION_JS = f"""
+        (function() {{
+            if (document.getElementById('low-bandwidth-style')) return;
+            var style = document.createElement('style');
+            style.id = 'low-bandwidth-style';
+            style.textContent = '{NO_ANIMATION_CSS}';
+            (document.head || document.documentElement).appendChild(style);
+        }})();
+    """
+    RESTORE_ANIMATION_JS = "(function() { var s = document.getElementById('low-bandwidth-style'); if (s) s.remove(); })();"
+    LOW_BANDWIDTH_SETTINGS = {
+        QWebEngineSettings.AutoLoadImages: False,
+        QWebEngineSettings.PlaybackRequiresUserGesture: True,
+    }
+
+    def set_low_bandwidth(self, enabled, blocker):
+        # Takes effect for every later request; pages already open also get
+        # the animation style injected or removed by the caller. The settings
+        # it overrides are saved on the way in and put back on the way out.
+        settings = self.profile.settings()
+        if enabled and self.saved_settings is None:
+            self.saved_settings = {attribute: settings.testAttribute(attribute)
+                                   for attribute in self.LOW_BANDWIDTH_SETTINGS}
+            for attribute, value in self.LOW_BANDWIDTH_SETTINGS.items():
+                settings.setAttribute(attribute, value)
+        elif not enabled and self.saved_settings is not None:
+            for attribute, value in self.saved_settings.items():
+                settings.setAttribute(attribute, value)
+            self.saved_settings = None
+        blocker.blocked_types = self.LOW_BANDWIDTH_TYPES if enabled else frozenset()
+        scripts = self.profile.scripts()
+        for script in scripts.findScripts('low-bandwidth'):
+            scripts.remove(script)
+        if enabled:
+            script = QWebEngineScript()
+            script.setName('low-bandwidth')
+            script.setInjectionPoint(QWebEngineScript.DocumentReady)
+            script.setWorldId(QWebEngineScript.ApplicationWorld)
+            script.setRunsOnSubFrames(True)
+            script.setSourceCode(self.NO_ANIMATION_JS)
+            scripts.insert(script)
+
+    def disk_cache_bytes(self):
+        if self.cache_path is None:
+            return 0
+        total = 0
+        for root, _, files in os.walk(self.cache_path):
+            for filename in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, filename))
+                except OSError:
+                    pass
+        return total
+
+    def pressure_reason(self, memory_kb):
+        # Why the HTTP cache should be cleared, if at all: the on-disk cache
+        # outgrew its cap or the process tree (browser plus renderers)
+        # exceeds the memory cap. Touches no Qt objects, so it may run on a
+        # worker thread.
+        if self.cache_cap_bytes and self.disk_cache_bytes() > self.cache_cap_bytes:
+            return 'disk'
+        if self.memory_cap_kb and memory_kb and memory_kb > self.memory_cap_kb:
+            return 'memory'
+        return None
+
+    def clear_cache(self):
+        self.profile.clearHttpCache()
+        self.cache_clears += 1
+
 class ScrollableWebView(QWebEngineView):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, metrics=None, profile=None):
         super().__init__(parent)
+        self.metrics = metrics
+        if profile is not None:
+            self.setPage(QWebEnginePage(profile, self))
         self.setFocusPolicy(Qt.StrongFocus)
         # Enable wheel events to trigger scrolling
         self.setAttribute(Qt.WA_AcceptTouchEvents)
@@ -40,21 +657,455 @@ class ScrollableWebView(QWebEngineView):
         delta = event.angleDelta().y()
         direction = 'up' if delta > 0 else 'down'
         amount = abs(delta)
+        if self.metrics:
+            self.metrics.inc('browser_runjavascript_calls_total', source='wheel')
         self.page().runJavaScript(f"window.scrollBy(0, {-amount if direction == 'up' else amount});")
         event.accept()
 
-class WebBrowser(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.image_lock = threading.Lock()
-        self.image_condition = threading.Condition(self.image_lock)
-        self.latest_image = None
-        self.initialize_ui()
-
-    def initialize_ui(self):
-        self.setWindowTitle("Python Web Browser")
-        self.setGeometry(100, 100, 1024, 768)
-
+class TabRecord:
+    def __init__(self, tab_id, tab, view):
+        self.id = tab_id
+        self.tab = tab
+        self.view = view
+        self.last_active = time.monotonic()
+        self.state = 'active'
+        self.discarded_url = None
+        self.watchers = 0
+        # Whether the page has the low-bandwidth animation style applied.
+        self.low_bandwidth = False
+
+class TabLifecycleManager:
+    # Moves hidden tabs to frozen (no JS, timers or rendering) and then
+    # discarded (renderer state dropped) after configurable idle periods, and
+    # restores them when they become current again. Uses Qt's page lifecycle
+    # API where available (Qt 5.14+); older Qt only gets an about:blank discard.
+    def __init__(self, current_tab, freeze_after=60, discard_after=600, check_interval=5000, on_restore=None):
+        self.current_tab = current_tab
+        # Called with the record once a frozen or discarded tab is active again.
+        self.on_restore = on_restore
+        self.freeze_after = freeze_after
+        self.discard_after = discard_after
+        self.check_interval = check_interval
+        self.records = {}
+        self.next_id = 1
+        self.has_lifecycle_api = hasattr(QWebEnginePage, 'setLifecycleState')
+
+    def start(self, parent):
+        self.timer = QTimer(parent)
+        self.timer.timeout.connect(self.check)
+        self.timer.start(self.check_interval)
+
+    def register(self, tab, view):
+        record = TabRecord(self.next_id, tab, view)
+        self.next_id += 1
+        self.records[record.id] = record
+        return record
+
+    def unregister(self, tab):
+        record = self.record_for_tab(tab)
+        if record:
+            del self.records[record.id]
+        return record
+
+    def record_for_tab(self, tab):
+        for record in self.records.values():
+            if record.tab is tab:
+                return record
+        return None
+
+    def activate(self, tab):
+        record = self.record_for_tab(tab)
+        if record is None:
+            return
+        record.last_active = time.monotonic()
+        if record.state == 'active':
+            return
+        if self.has_lifecycle_api:
+            record.view.page().setLifecycleState(QWebEnginePage.LifecycleState.Active)
+        elif record.discarded_url is not None:
+            record.view.load(record.discarded_url)
+        record.discarded_url = None
+        record.state = 'active'
+        if self.on_restore:
+            self.on_restore(record)
+
+    def check(self):
+        now = time.monotonic()
+        current_tab = self.current_tab()
+        for record in self.records.values():
+            # Tabs someone is streaming count as in use even in the background.
+            if record.tab is current_tab or record.watchers:
+                record.last_active = now
+                continue
+            idle = now - record.last_active
+            if idle >= self.discard_after and record.state != 'discarded':
+                self.set_state(record, 'discarded')
+            elif idle >= self.freeze_after and record.state == 'active':
+                self.set_state(record, 'frozen')
+
+    def set_state(self, record, state):
+        page = record.view.page()
+        try:
+            if self.has_lifecycle_api:
+                # Qt will not freeze a visible page; the overview may have
+                # kept this background page rendering.
+                if not record.view.isVisible() and page.isVisible():
+                    page.setVisible(False)
+                target = (QWebEnginePage.LifecycleState.Frozen if state == 'frozen'
+                          else QWebEnginePage.LifecycleState.Discarded)
+                page.setLifecycleState(target)
+            elif state == 'discarded':
+                record.discarded_url = record.view.url()
+                record.view.load(QUrl("about:blank"))
+            else:
+                return
+        except Exception as e:
+            print(f"Could not move tab {record.id} to {state}: {e}")
+            return
+        record.state = state
+
+    def usage(self, record):
+        # Renderer processes can be shared between tabs of the same site, so
+        # the figures are per renderer, not strictly per tab.
+        pid = None
+        if hasattr(record.view.page(), 'renderProcessPid'):
+            pid = record.view.page().renderProcessPid() or None
+        rss_kb = cpu_seconds = None
+        if pid:
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            rss_kb = int(line.split()[1])
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            except OSError:
+                pass
+        return {'renderer_pid': pid, 'rss_kb': rss_kb, 'cpu_seconds': cpu_seconds}
+
+    def report(self):
+        now = time.monotonic()
+        tabs = []
+        for record in self.records.values():
+            entry = {
+                'id': record.id,
+                'title': record.view.title(),
+                'url': record.view.url().toString(),
+                'state': record.state,
+                'watchers': record.watchers,
+                'idle_seconds': round(now - record.last_active, 1),
+            }
+            entry.update(self.usage(record))
+            tabs.append(entry)
+        return tabs
+
+class TabCapture:
+    # Capture loop for one tab, independent of which tab is current. Each
+    # subscriber asks for an interval and the timer runs at the fastest one;
+    # with no subscribers left the loop stops and the buffer is dropped.
+    def __init__(self, record, capture, parent, keep_visible):
+        self.record = record
+        # Tells whether an overview still needs this page rendering.
+        self.keep_visible = keep_visible
+        self.frame_buffer = FrameBuffer(capacity=16)
+        self.intervals = []
+        self.timer = QTimer(parent)
+        self.timer.timeout.connect(lambda: capture(self))
+
+    def subscribe(self, interval):
+        self.intervals.append(interval)
+        self.record.watchers = len(self.intervals)
+        self.timer.start(min(self.intervals))
+
+    def unsubscribe(self, interval):
+        if interval in self.intervals:
+            self.intervals.remove(interval)
+        self.record.watchers = len(self.intervals)
+        if self.intervals:
+            self.timer.start(min(self.intervals))
+        else:
+            self.stop()
+
+    def stop(self):
+        self.timer.stop()
+        self.timer.deleteLater()
+        self.record.watchers = 0
+        self.frame_buffer.close()
+        # Hand a background page back to normal visibility so it can be
+        # frozen, unless an overview tile is still following it.
+        view = self.record.view
+        if not view.isVisible() and hasattr(view.page(), 'setVisible') and not self.keep_visible(self.record):
+            view.page().setVisible(False)
+
+class OverviewMosaic:
+    # Composites downscaled thumbnails of many tabs into one grid for
+    # /overview. Each tick refreshes a single tile, round-robin, so every tab
+    # is grabbed once per len(tabs) ticks; frozen or discarded tabs keep their
+    # cached tile. A frame is only encoded when a tile or the layout changed.
+    def __init__(self, sources, encode, parent, tile_size=(320, 200), interval=250):
+        self.sources = sources
+        self.encode = encode
+        self.tile_width, self.tile_height = tile_size
+        self.label_height = 18
+        self.tiles = {}
+        self.layout = None
+        self.next_index = 0
+        self.subscribers = 0
+        # Background tabs whose pages this mosaic keeps rendering.
+        self.revealed = []
+        self.frame_buffer = FrameBuffer(capacity=8)
+        self.interval = interval
+        self.timer = QTimer(parent)
+        self.timer.timeout.connect(self.tick)
+
+    def subscribe(self):
+        self.subscribers += 1
+        if self.subscribers == 1:
+            self.layout = None  # publish a fresh frame on the first tick
+            self.timer.start(self.interval)
+
+    def unsubscribe(self):
+        self.subscribers = max(0, self.subscribers - 1)
+        if not self.subscribers:
+            self.timer.stop()
+            self.hide_revealed()
+
+    def reveal(self, record):
+        # A hidden view's page stops producing frames; keep it rendering
+        # (Qt 5.14+) while the overview is watched, as capture_tab does.
+        # A page a tab stream already made visible is tracked too, so the
+        # stream ending does not hide it while the overview still needs it.
+        page = record.view.page()
+        if not record.view.isVisible() and hasattr(page, 'setVisible'):
+            if not page.isVisible():
+                page.setVisible(True)
+            if record not in self.revealed:
+                self.revealed.append(record)
+
+    def hide_revealed(self):
+        for record in self.revealed:
+            try:
+                if not record.view.isVisible() and not record.watchers:
+                    record.view.page().setVisible(False)
+            except RuntimeError:
+                pass  # the tab was closed meanwhile
+        self.revealed = []
+
+    def tick(self):
+        sources = self.sources()
+        keys = [key for key, _, _ in sources]
+        changed = keys != self.layout
+        if changed:
+            self.layout = keys
+            self.tiles = {key: tile for key, tile in self.tiles.items() if key in keys}
+        if sources:
+            key, _, record = sources[self.next_index % len(sources)]
+            self.next_index += 1
+            if record.state == 'active' or key not in self.tiles:
+                if record.state == 'active':
+                    self.reveal(record)
+                thumbnail = record.tab.grab().toImage().scaled(
+                    self.tile_width, self.tile_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                if thumbnail != self.tiles.get(key):
+                    self.tiles[key] = thumbnail
+                    changed = True
+        if changed:
+            self.publish(sources)
+
+    def publish(self, sources):
+        columns = max(1, math.ceil(math.sqrt(len(sources))))
+        rows = max(1, math.ceil(len(sources) / columns))
+        cell_height = self.tile_height + self.label_height
+        image = QImage(columns * self.tile_width, rows * cell_height, QImage.Format_RGB32)
+        image.fill(QColor(32, 32, 32))
+        painter = QPainter(image)
+        painter.setPen(QColor(220, 220, 220))
+        for index, (key, label, _) in enumerate(sources):
+            x = (index % columns) * self.tile_width
+            y = (index // columns) * cell_height
+            tile = self.tiles.get(key)
+            if tile is not None:
+                painter.drawImage(x + (self.tile_width - tile.width()) // 2, y, tile)
+            text = painter.fontMetrics().elidedText(label, Qt.ElideRight, self.tile_width - 8)
+            painter.drawText(x + 4, y + self.tile_height, self.tile_width - 8, self.label_height,
+                             Qt.AlignLeft | Qt.AlignVCenter, text)
+        painter.end()
+        data, content_type = self.encode(image)
+        self.frame_buffer.publish(data, content_type=content_type)
+
+class PageLoadLog:
+    # Append-only JSON-lines log of navigation timings. When the file passes
+    # max_bytes it is rotated to <path>.1 (one generation kept), so disk use
+    # stays bounded. Recent entries are also kept in memory for queries.
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, history=5000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries = collections.deque(maxlen=history)
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        for existing in (path + ".1", path):
+            if os.path.exists(existing):
+                with open(existing) as f:
+                    for line in f:
+                        try:
+                            self.entries.append(json.loads(line))
+                        except ValueError:
+                            pass
+
+    def append(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            self.entries.append(entry)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Could not write page load log: {e}")
+
+    @staticmethod
+    def percentile(ordered, fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    def stats(self, domain=None):
+        with self.lock:
+            entries = list(self.entries)
+        by_domain = collections.defaultdict(list)
+        for entry in entries:
+            if entry.get('load_ms') is not None and (domain is None or entry['domain'] == domain):
+                by_domain[entry['domain']].append(entry['load_ms'])
+        result = {}
+        for name, loads in by_domain.items():
+            loads.sort()
+            result[name] = {
+                'count': len(loads),
+                'p50_ms': round(self.percentile(loads, 0.50), 1),
+                'p95_ms': round(self.percentile(loads, 0.95), 1),
+                'max_ms': round(loads[-1], 1),
+            }
+        return dict(sorted(result.items(), key=lambda item: -item[1]['p95_ms']))
+
+class HeadlessTabs(QObject):
+    # Minimal stand-in for the parts of QTabWidget that BrowserCore uses,
+    # holding bare views. Only the current view is shown (on the offscreen
+    # platform), which keeps hidden tabs eligible for freezing.
+    currentChanged = pyqtSignal(int)
+
+    def __init__(self, viewport, parent=None):
+        super().__init__(parent)
+        self.viewport = viewport
+        self.views = []
+        self.titles = []
+        self.current = -1
+
+    def addTab(self, widget, title):
+        widget.resize(*self.viewport)
+        self.views.append(widget)
+        self.titles.append(title)
+        if self.current == -1:
+            self.setCurrentIndex(0)
+        return len(self.views) - 1
+
+    def removeTab(self, index):
+        if not 0 <= index < len(self.views):
+            return
+        widget = self.views.pop(index)
+        self.titles.pop(index)
+        widget.hide()
+        if index < self.current:
+            self.current -= 1
+        elif index == self.current:
+            self.current = -1
+            if self.views:
+                self.setCurrentIndex(min(index, len(self.views) - 1))
+
+    def widget(self, index):
+        return self.views[index] if 0 <= index < len(self.views) else None
+
+    def currentWidget(self):
+        return self.widget(self.current)
+
+    def currentIndex(self):
+        return self.current
+
+    def setCurrentIndex(self, index):
+        if not 0 <= index < len(self.views) or index == self.current:
+            return
+        previous = self.currentWidget()
+        self.current = index
+        self.views[index].show()
+        if previous is not None:
+            previous.hide()
+        self.currentChanged.emit(index)
+
+    def count(self):
+        return len(self.views)
+
+    def indexOf(self, widget):
+        return self.views.index(widget) if widget in self.views else -1
+
+    def tabText(self, index):
+        return self.titles[index]
+
+    def setTabText(self, index, text):
+        if 0 <= index < len(self.titles):
+            self.titles[index] = text
+
+class BrowserCore:
+    # Everything that does not need window chrome: tabs, capture, command
+    # dispatch, metrics and the HTTP server. Mixed into WebBrowser (a
+    # QMainWindow with toolbars) and HeadlessEngine (a bare QObject).
+    # Hooks for the concrete class: create_tabs() is required;
+    # show_status() and create_tab_widget() have working defaults.
+    def setup_core(self, server_port=8000, home_url="https://www.google.com", profile_name=None,
+                   storage_path=None, cache_size_mb=64, cache_cap_mb=256, memory_cap_mb=None,
+                   blocklist_path=None, server_host="", frame_server_port=None, max_sessions=16, host=None,
+                   view_pool_size=2):
+        self.server_port = server_port
+        self.server_host = server_host
+        self.frame_server_port = frame_server_port
+        # A hosted session (host is set) shares its host's process-wide
+        # diagnostics; the host owns the HTTP server and the session table.
+        self.host = host
+        self.sessions = {}
+        self.max_sessions = max_sessions
+        self.view_pool_size = view_pool_size
+        self.home_url = home_url
+        # Not parented to the window: Qt deletes children in creation order and
+        # the profile must outlive every page that uses it.
+        self.session_profile = SessionProfile(profile_name, storage_path, cache_size_mb,
+                                              cache_cap_mb, memory_cap_mb)
+        self.blocklist_path = blocklist_path
+        self.low_bandwidth = False
+        self.frame_buffer = FrameBuffer(capacity=64)
+        self.latency_histograms = {
+            'grab': Histogram(),
+            'encode': Histogram(),
+            'publish': Histogram(),
+            'send': Histogram(),
+            'capture_to_wire': Histogram(),
+        }
+        if host is None:
+            self.page_load_log = PageLoadLog(os.path.join(os.getcwd(), "logs", "page_loads.jsonl"))
+            self.watchdog = StallWatchdog(threshold_ms=250, heartbeat_ms=50)
+            self.trace = TraceBuffer()
+        else:
+            self.page_load_log = host.page_load_log
+            self.watchdog = host.watchdog
+            self.trace = host.trace
+        self.setup_metrics()
+        rules = host.content_blocker.rules if host else self.load_blocklist()
+        self.content_blocker = ContentBlocker(rules, metrics=self.metrics)
+        if hasattr(self.session_profile.profile, 'setUrlRequestInterceptor'):
+            self.session_profile.profile.setUrlRequestInterceptor(self.content_blocker)
+        else:  # Qt < 5.13
+            self.session_profile.profile.setRequestInterceptor(self.content_blocker)
+
+    def initialize_engine(self):
         self.server_dir = os.path.join(os.getcwd(), "server_files")
         if not os.path.exists(self.server_dir):
             os.makedirs(self.server_dir)
@@ -66,30 +1117,110 @@ class WebBrowser(QMainWindow):
         self.command_timer.timeout.connect(self.process_commands)
         self.command_timer.start(100)
 
-        self.server_port = 8000
+        if self.host is None:
+            self.watchdog.start(self)
+        self.profiler = SamplingProfiler()
+        # Admin routes (/admin/...) are disabled unless a token is configured.
+        self.admin_token = os.environ.get("BROWSER_ADMIN_TOKEN", "")
 
         self.stream_enabled = True
         self.stream_interval = 25  # 25fps
+        self.stream_format = "JPEG"
+        self.stream_quality = 70
         self.stream_timer = QTimer(self)
         self.stream_timer.timeout.connect(self.update_stream)
         self.stream_timer.start(self.stream_interval)
-
-        self.tabs = QTabWidget()
-        self.tabs.setTabsClosable(True)
-        self.tabs.tabCloseRequested.connect(self.close_tab)
-
-        self.create_actions()
-        self.create_toolbar()
-
-        self.status_bar = QStatusBar()
-        self.setStatusBar(self.status_bar)
-
-        self.add_new_tab()
-        self.setCentralWidget(self.tabs)
-
-        self.start_http_server()
-
-        self.show()
+        # Background tabs streamed via /stream?tab=<id>, keyed by tab id.
+        self.tab_captures = {}
+        # Built on the first /overview subscriber and kept with its tile
+        # cache; keyed by whether hosted sessions' tabs are included.
+        self.overviews = {}
+
+        # Optionally mirror frames into shared memory for a frame server
+        # running in its own process, away from this process's GIL.
+        self.frame_ring = None
+        if self.frame_server_port:
+            self.frame_ring = framering.SharedFrameRing(create=True)
+            self.frame_notifier = framering.FrameNotifier()
+            self.frame_server = framering.spawn_frame_server(
+                self.frame_ring, self.frame_notifier, self.frame_server_port, self.server_host)
+            atexit.register(self.stop_frame_server)
+
+        self.tabs = self.create_tabs()
+        self.tabs.currentChanged.connect(self.tab_changed)
+
+        self.tab_lifecycle = TabLifecycleManager(self.tabs.currentWidget, freeze_after=60, discard_after=600,
+                                                 on_restore=self.apply_low_bandwidth)
+        self.tab_lifecycle.start(self)
+
+        self.pressure_check_running = False
+        self.profile_timer = QTimer(self)
+        self.profile_timer.timeout.connect(self.check_profile_pressure)
+        self.profile_timer.start(30000)
+
+        self.view_pool = ViewPool(self.create_tab_widget, size=self.view_pool_size,
+                                  is_idle=lambda: self.command_queue.empty())
+
+    def create_tabs(self):
+        # Required hook: returns the tab container (a QTabWidget or
+        # HeadlessTabs), called once from initialize_engine.
+        raise NotImplementedError(f"{type(self).__name__} must implement create_tabs()")
+
+    def show_status(self, message, timeout=0):
+        pass
+
+    def create_tab_widget(self):
+        browser = ScrollableWebView(metrics=self.metrics, profile=self.session_profile.profile)
+        return browser, browser
+
+    def setup_metrics(self):
+        self.metrics = Metrics()
+        self.metrics.describe('stream_frames_captured_total', 'counter', 'Frames grabbed and encoded by update_stream')
+        self.metrics.describe('stream_frames_skipped_total', 'counter', 'Capture ticks that produced no frame, and frames a client never received')
+        self.metrics.describe('stream_stage_latency_milliseconds', 'histogram', 'Per-frame pipeline stage durations')
+        self.metrics.describe('stream_bytes_sent_total', 'counter', 'Frame bytes written to all stream clients')
+        self.metrics.describe('stream_client_bytes_sent_total', 'counter', 'Frame bytes written to each connected stream client')
+        self.metrics.describe('stream_active_subscribers', 'gauge', 'Open /stream connections')
+        self.metrics.describe('browser_command_queue_depth', 'gauge', 'Commands waiting for the GUI thread')
+        self.metrics.describe('browser_commands_processed_total', 'counter', 'Commands dispatched by process_commands')
+        self.metrics.describe('browser_runjavascript_calls_total', 'counter', 'runJavaScript calls issued')
+        self.metrics.describe('browser_page_load_milliseconds', 'histogram', 'Time from load start to 100% progress')
+        for stage, histogram in self.latency_histograms.items():
+            self.metrics.register_histogram('stream_stage_latency_milliseconds', histogram, stage=stage)
+        self.page_load_histogram = self.metrics.register_histogram(
+            'browser_page_load_milliseconds',
+            Histogram((100, 250, 500, 1000, 2500, 5000, 10000, 30000)))
+        self.metrics.describe('browser_gui_stall_milliseconds', 'histogram', 'GUI thread stalls above the watchdog threshold')
+        self.metrics.describe('browser_event_loop_lag_milliseconds', 'histogram', 'Heartbeat timer lateness on the GUI thread')
+        self.metrics.describe('browser_gui_stalls_total', 'counter', 'GUI thread stalls detected by the watchdog')
+        self.metrics.register_histogram('browser_gui_stall_milliseconds', self.watchdog.stall_histogram)
+        self.metrics.register_histogram('browser_event_loop_lag_milliseconds', self.watchdog.lag_histogram)
+        self.metrics.register_callback('browser_gui_stalls_total', lambda: self.watchdog.stall_count)
+        self.metrics.describe('browser_view_pool_takes_total', 'counter', 'New tabs served from the pre-warmed view pool (hit) or built on demand (miss)')
+        self.metrics.describe('browser_tabs', 'gauge', 'Open tabs by lifecycle state')
+        for state in ('active', 'frozen', 'discarded'):
+            self.metrics.register_callback(
+                'browser_tabs',
+                lambda state=state: sum(1 for record in list(self.tab_lifecycle.records.values()) if record.state == state),
+                state=state)
+        self.metrics.describe('browser_profile_cache_clears_total', 'counter', 'HTTP cache clears triggered by the disk or memory cap')
+        self.metrics.describe('browser_blocked_requests_total', 'counter', 'Sub-resource requests dropped by the blocklist or low-bandwidth mode')
+        self.metrics.describe('browser_sessions', 'gauge', 'Sessions hosted under /s/<id>/ by this process')
+        self.metrics.register_callback('browser_sessions', lambda: len(self.sessions))
+        self.metrics.set('stream_active_subscribers', 0)
+        self.metrics.register_callback('browser_command_queue_depth', lambda: self.command_queue.qsize())
+
+    def run_javascript(self, page, js_code, source, callback=None):
+        self.metrics.inc('browser_runjavascript_calls_total', source=source)
+        # The span runs from the call until the renderer reports back.
+        async_id = self.trace.async_begin(f'runJavaScript:{source}', 'input')
+
+        def finished(result):
+            self.trace.async_end(f'runJavaScript:{source}', 'input', async_id)
+            if callback:
+                callback(result)
+
+        page.runJavaScript(js_code, finished)
 
     def write_static_html(self):
         html_content = """
@@ -114,11 +1245,11 @@ class WebBrowser(QMainWindow):
                     const scaleY = img.naturalHeight / rect.height;
                     const actualX = Math.round(x * scaleX);
                     const actualY = Math.round(y * scaleY);
-                    fetch(`/click?x=${actualX}&y=${actualY}`);
+                    fetch(`click?x=${actualX}&y=${actualY}`);
                 }
 
                 function scroll(direction, amount) {
-                    fetch(`/scroll?direction=${direction}&amount=${amount}`);
+                    fetch(`scroll?direction=${direction}&amount=${amount}`);
                 }
 
                 document.addEventListener('keydown', function(event) {
@@ -129,7 +1260,7 @@ class WebBrowser(QMainWindow):
                         shift: event.shiftKey,
                         alt: event.altKey
                     };
-                    fetch(`/type?key=${encodeURIComponent(key)}&modifiers=${encodeURIComponent(JSON.stringify(modifiers))}`);
+                    fetch(`type?key=${encodeURIComponent(key)}&modifiers=${encodeURIComponent(JSON.stringify(modifiers))}`);
                 });
 
                 document.addEventListener('wheel', function(event) {
@@ -171,15 +1302,18 @@ class WebBrowser(QMainWindow):
         </head>
         <body>
             <div class="control-panel">
-                <form action="/navigate" method="get">
+                <form action="navigate" method="get">
                     <input type="text" name="url" placeholder="Enter URL" style="width: 300px;">
                     <button type="submit">Go</button>
                 </form>
-                <button onclick="location.href='/switch_tab?direction=prev'">Previous Tab</button>
-                <button onclick="location.href='/switch_tab?direction=next'">Next Tab</button>
+                <button onclick="location.href='switch_tab?direction=prev'">Previous Tab</button>
+                <button onclick="location.href='switch_tab?direction=next'">Next Tab</button>
+                <button onclick="location.href='new_tab'">New Tab</button>
+                <button onclick="location.href='low_bandwidth?enabled=1'">Low Bandwidth On</button>
+                <button onclick="location.href='low_bandwidth?enabled=0'">Low Bandwidth Off</button>
             </div>
             <div class="browser-view">
-                <img id="stream-image" src="/stream" alt="Browser Stream View">
+                <img id="stream-image" src="stream" alt="Browser Stream View">
             </div>
         </body>
         </html>
@@ -187,121 +1321,127 @@ class WebBrowser(QMainWindow):
         with open(os.path.join(self.server_dir, "index.html"), "w") as f:
             f.write(html_content)
 
-    def create_actions(self):
-        self.back_action = QAction("Back", self)
-        self.back_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_Left))
-        self.back_action.triggered.connect(self.navigate_back)
-
-        self.forward_action = QAction("Forward", self)
-        self.forward_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_Right))
-        self.forward_action.triggered.connect(self.navigate_forward)
-
-        self.reload_action = QAction("Reload", self)
-        self.reload_action.setShortcut(QKeySequence(Qt.Key_F5))
-        self.reload_action.triggered.connect(self.reload_page)
-
-        self.home_action = QAction("Home", self)
-        self.home_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_H))
-        self.home_action.triggered.connect(self.navigate_home)
-
-        self.new_tab_action = QAction("New Tab", self)
-        self.new_tab_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_T))
-        self.new_tab_action.triggered.connect(self.add_new_tab)
-
-        self.toggle_stream_action = QAction("Toggle Stream", self)
-        self.toggle_stream_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_A))
-        self.toggle_stream_action.triggered.connect(self.toggle_stream)
-        self.toggle_stream_action.setCheckable(True)
-        self.toggle_stream_action.setChecked(True)
-        
-        # Add scroll actions with keyboard shortcuts
-        self.scroll_up_action = QAction("Scroll Up", self)
-        self.scroll_up_action.setShortcut(QKeySequence(Qt.Key_Up))
-        self.scroll_up_action.triggered.connect(lambda: self.handle_scroll("up", 100))
-        
-        self.scroll_down_action = QAction("Scroll Down", self)
-        self.scroll_down_action.setShortcut(QKeySequence(Qt.Key_Down))
-        self.scroll_down_action.triggered.connect(lambda: self.handle_scroll("down", 100))
-        
-        self.page_up_action = QAction("Page Up", self)
-        self.page_up_action.setShortcut(QKeySequence(Qt.Key_PageUp))
-        self.page_up_action.triggered.connect(lambda: self.handle_scroll("up", 500))
-        
-        self.page_down_action = QAction("Page Down", self)
-        self.page_down_action.setShortcut(QKeySequence(Qt.Key_PageDown))
-        self.page_down_action.triggered.connect(lambda: self.handle_scroll("down", 500))
-
-    def create_toolbar(self):
-        navigation_bar = QToolBar("Navigation")
-        self.addToolBar(navigation_bar)
-
-        navigation_bar.addAction(self.back_action)
-        navigation_bar.addAction(self.forward_action)
-        navigation_bar.addAction(self.reload_action)
-        navigation_bar.addAction(self.home_action)
-        navigation_bar.addAction(self.new_tab_action)
-        navigation_bar.addAction(self.toggle_stream_action)
-
-        self.url_bar = QLineEdit()
-        self.url_bar.returnPressed.connect(self.navigate_to_url)
-        navigation_bar.addWidget(self.url_bar)
-
-        go_button = QPushButton("Go")
-        go_button.clicked.connect(self.navigate_to_url)
-        navigation_bar.addWidget(go_button)
-        
-        # Add scroll buttons to toolbar
-        scroll_bar = QToolBar("Scrolling")
-        self.addToolBar(scroll_bar)
-        
-        scroll_up_button = QPushButton("Scroll Up")
-        scroll_up_button.clicked.connect(lambda: self.handle_scroll("up", 100))
-        scroll_bar.addWidget(scroll_up_button)
-        
-        scroll_down_button = QPushButton("Scroll Down")
-        scroll_down_button.clicked.connect(lambda: self.handle_scroll("down", 100))
-        scroll_bar.addWidget(scroll_down_button)
-
     def add_new_tab(self, url=None):
-        # Use our custom ScrollableWebView instead of the standard QWebEngineView
-        browser = ScrollableWebView()
+        (tab, browser), hit = self.view_pool.take()
+        self.metrics.inc('browser_view_pool_takes_total', result='hit' if hit else 'miss')
+        record = self.tab_lifecycle.register(tab, browser)
+        # The profile script styles pages loaded from now on.
+        record.low_bandwidth = self.low_bandwidth
+        browser.page().loadStarted.connect(self.mark_load_started)
+        browser.page().loadFinished.connect(self.collect_navigation_timing)
         browser.page().loadProgress.connect(self.update_loading_progress)
         browser.page().loadFinished.connect(self.update_url)
         browser.page().titleChanged.connect(self.update_title)
-        
-        # Create a scroll area to contain the browser
-        scroll_area = QScrollArea()
-        scroll_area.setWidget(browser)
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-
-        layout = QVBoxLayout()
-        layout.addWidget(scroll_area)
-        layout.setContentsMargins(0, 0, 0, 0)
-
-        tab = QWidget()
-        tab.setLayout(layout)
 
         index = self.tabs.addTab(tab, "New Tab")
         self.tabs.setCurrentIndex(index)
 
         if url:
-            browser.load(QUrl(url))
+            browser.load(QUrl(self.normalize_url(url)))
         else:
-            browser.load(QUrl("https://www.google.com"))
+            browser.load(QUrl(self.home_url))
 
     def close_tab(self, index):
         if self.tabs.count() > 1:
+            tab = self.tabs.widget(index)
             self.tabs.removeTab(index)
+            record = self.tab_lifecycle.unregister(tab)
+            capture = self.tab_captures.pop(record.id, None) if record else None
+            if capture:
+                capture.stop()
+            # removeTab only detaches the widget; free the page and its renderer.
+            tab.deleteLater()
         else:
             current_browser = self.get_current_browser()
-            current_browser.load(QUrl("https://www.google.com"))
+            current_browser.load(QUrl(self.home_url))
+
+    def create_session(self):
+        if len(self.sessions) >= self.max_sessions:
+            return None
+        session_id = secrets.token_urlsafe(8)
+        self.sessions[session_id] = BrowserSession(self, session_id)
+        return session_id
+
+    def destroy_session(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close_session()
+        return True
+
+    def session_report(self):
+        return [{
+            'id': session_id,
+            'tabs': session.tabs.count(),
+            'url': session.get_current_browser().url().toString() if session.get_current_browser() else None,
+            'created': session.created,
+        } for session_id, session in self.sessions.items()]
+
+    def load_blocklist(self):
+        if not self.blocklist_path or not os.path.exists(self.blocklist_path):
+            return DomainRuleSet()
+        try:
+            return DomainRuleSet.from_file(self.blocklist_path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Could not load blocklist {self.blocklist_path}: {e}")
+            return DomainRuleSet()
+
+    def set_low_bandwidth(self, enabled):
+        self.low_bandwidth = enabled
+        self.session_profile.set_low_bandwidth(enabled, self.content_blocker)
+        # Frozen and discarded tabs catch up when they are restored.
+        for record in self.tab_lifecycle.records.values():
+            if record.state == 'active':
+                self.apply_low_bandwidth(record)
+        self.show_status(f"Low-bandwidth mode {'on' if enabled else 'off'}", 2000)
+
+    def apply_low_bandwidth(self, record):
+        if record.low_bandwidth == self.low_bandwidth:
+            return
+        js_code = SessionProfile.NO_ANIMATION_JS if self.low_bandwidth else SessionProfile.RESTORE_ANIMATION_JS
+        self.run_javascript(record.view.page(), js_code, 'low_bandwidth')
+        record.low_bandwidth = self.low_bandwidth
+
+    def check_profile_pressure(self):
+        # Only the renderer pids are read on the GUI thread. The /proc reads
+        # and the cache walk run on a worker thread, which queues any cache
+        # clear back here.
+        if self.pressure_check_running:
+            return
+        renderers = set()
+        for record in self.tab_lifecycle.records.values():
+            page = record.view.page()
+            if hasattr(page, 'renderProcessPid') and page.renderProcessPid():
+                renderers.add(page.renderProcessPid())
+        self.pressure_check_running = True
+        threading.Thread(target=self.measure_profile_pressure, args=(renderers,), daemon=True).start()
+
+    def measure_profile_pressure(self, renderers):
+        try:
+            memory_kb = 0
+            for pid in list(renderers) + ['self']:
+                try:
+                    with open(f"/proc/{pid}/status") as f:
+                        for line in f:
+                            if line.startswith("VmRSS:"):
+                                memory_kb += int(line.split()[1])
+                except OSError:
+                    pass
+            reason = self.session_profile.pressure_reason(memory_kb)
+            if reason:
+                self.command_queue.put(('clear_http_cache', reason))
+        finally:
+            self.pressure_check_running = False
+
+    def tab_changed(self, index):
+        self.tab_lifecycle.activate(self.tabs.widget(index))
 
     def get_current_browser(self):
         current_tab = self.tabs.currentWidget()
         if not current_tab:
             return None
+        if isinstance(current_tab, QWebEngineView):
+            return current_tab
         layout = current_tab.layout()
         if not layout or layout.count() == 0:
             return None
@@ -310,13 +1450,13 @@ class WebBrowser(QMainWindow):
             return scroll_area.widget()
         return layout.itemAt(0).widget()
 
-    def navigate_to_url(self):
-        url = self.url_bar.text()
-        self.load_url(url)
+    def normalize_url(self, url):
+        if not url.startswith(("http://", "https://", "file://", "about:")):
+            url = "http://" + url
+        return url
 
     def load_url(self, url):
-        if not url.startswith(("http://", "https://")):
-            url = "http://" + url
+        url = self.normalize_url(url)
         current_browser = self.get_current_browser()
         if current_browser:
             current_browser.load(QUrl(url))
@@ -339,48 +1479,205 @@ class WebBrowser(QMainWindow):
     def navigate_home(self):
         current_browser = self.get_current_browser()
         if current_browser:
-            current_browser.load(QUrl("https://www.google.com"))
+            current_browser.load(QUrl(self.home_url))
 
     def update_url(self):
-        current_browser = self.get_current_browser()
-        if current_browser:
-            self.url_bar.setText(current_browser.url().toString())
+        pass
 
     def update_title(self, title):
         index = self.tabs.currentIndex()
         if title:
             self.tabs.setTabText(index, title[:15] + "..." if len(title) > 15 else title)
 
+    def mark_load_started(self):
+        page = self.sender()
+        if page is not None:
+            page.setProperty("load_started_at", time.time())
+            page.setProperty("load_trace_id", self.trace.async_begin('page_load', 'page'))
+
     def update_loading_progress(self, progress):
-        self.status_bar.showMessage(f"Loading: {progress}%")
+        self.show_status(f"Loading: {progress}%")
         if progress == 100:
-            self.status_bar.showMessage("Done", 2000)
+            self.show_status("Done", 2000)
+            page = self.sender()
+            started_at = page.property("load_started_at") if page is not None else None
+            if started_at:
+                self.page_load_histogram.observe((time.time() - started_at) * 1000)
+                self.trace.async_end('page_load', 'page', page.property("load_trace_id"),
+                                     url=page.url().toString())
+                page.setProperty("load_started_at", None)
+
+    NAVIGATION_TIMING_JS = """
+        (function() {
+            var nav = performance.getEntriesByType('navigation')[0];
+            if (!nav) return null;
+            var resources = performance.getEntriesByType('resource');
+            var transferred = 0;
+            for (var i = 0; i < resources.length; i++) { transferred += resources[i].transferSize || 0; }
+            var slowest = resources.slice().sort(function(a, b) { return b.duration - a.duration; })
+                .slice(0, 5).map(function(r) {
+                    return {name: r.name.slice(0, 200), type: r.initiatorType, duration_ms: Math.round(r.duration)};
+                });
+            return JSON.stringify({
+                ttfb_ms: nav.responseStart - nav.requestStart,
+                dom_content_loaded_ms: nav.domContentLoadedEventEnd - nav.startTime,
+                load_ms: (nav.loadEventEnd || performance.now()) - nav.startTime,
+                document_bytes: nav.transferSize,
+                resource_count: resources.length,
+                resource_bytes: transferred,
+                slowest_resources: slowest
+            });
+        })();
+    """
+
+    def collect_navigation_timing(self, ok):
+        page = self.sender()
+        if page is None or not ok:
+            return
+        url = page.url()
+        if url.scheme() not in ('http', 'https'):
+            return
+
+        def store(result):
+            if not result:
+                return
+            entry = json.loads(result)
+            entry.update({'timestamp': time.time(), 'url': url.toString(), 'domain': url.host()})
+            self.page_load_log.append(entry)
+
+        self.run_javascript(page, self.NAVIGATION_TIMING_JS, 'navigation_timing', store)
 
     def update_stream(self):
         if not self.stream_enabled:
+            self.metrics.inc('stream_frames_skipped_total', reason='disabled')
+            return
+        # Nobody is watching: skip the grab and encode. The frame server's
+        # clients are in another process, so a frame ring always counts.
+        if self.frame_ring is None and not self.frame_buffer.in_demand():
             return
         current_tab = self.tabs.currentWidget()
         if not current_tab:
+            self.metrics.inc('stream_frames_skipped_total', reason='no_tab')
             return
-        pixmap = current_tab.grab()
+        frame = self.capture_frame(current_tab, self.frame_buffer)
+        if self.frame_ring:
+            self.frame_ring.publish(frame.data, frame.timestamp, frame.content_type)
+            self.frame_notifier.notify()
+
+    def capture_frame(self, widget, frame_buffer, **trace_args):
+        timings = {'grab_start': time.time()}
+        pixmap = widget.grab()
         image = QImage(pixmap.toImage())
+        timings['grab_end'] = time.time()
+        data, content_type = self.encode_image(image)
+        timings['encode_end'] = time.time()
+        frame = frame_buffer.publish(data, timings['grab_start'], timings, content_type)
+        self.metrics.inc('stream_frames_captured_total')
+        self.record_frame_timings(frame)
+        self.trace.complete('grab', 'capture', timings['grab_start'], timings['grab_end'],
+                            sequence=frame.sequence, **trace_args)
+        self.trace.complete('encode', 'capture', timings['grab_end'], timings['encode_end'],
+                            sequence=frame.sequence, bytes=len(frame.data), **trace_args)
+        return frame
+
+    def encode_image(self, image):
         buffer = QBuffer()
         buffer.open(QBuffer.ReadWrite)
-        image.save(buffer, "JPEG", quality=70)
-        image_bytes = bytes(buffer.data())
-        with self.image_lock:
-            self.latest_image = image_bytes
-            self.image_condition.notify_all()
+        image.save(buffer, self.stream_format, quality=self.stream_quality)
+        content_type = "image/png" if self.stream_format == "PNG" else "image/jpeg"
+        return bytes(buffer.data()), content_type
+
+    def overview_sources(self, include_sessions=False):
+        # (key, label, tab record) for every tab; the admin overview also
+        # covers every session this engine hosts.
+        sources = [((None, record.id), f"{record.id}: {record.view.title()}", record)
+                   for record in self.tab_lifecycle.records.values()]
+        if not include_sessions:
+            return sources
+        for session_id, session in self.sessions.items():
+            sources.extend(((session_id, record.id), f"{session_id}/{record.id}: {record.view.title()}", record)
+                           for record in session.tab_lifecycle.records.values())
+        return sources
+
+    def revealed_by_overview(self, record):
+        # Overviews live on the host, including for a hosted session's tabs.
+        core = self.host or self
+        return any(record in overview.revealed for overview in core.overviews.values() if overview.subscribers)
+
+    def unsubscribe_overview(self, include_sessions):
+        overview = self.overviews.get(include_sessions)
+        if overview is not None:
+            overview.unsubscribe()
+
+    def subscribe_overview(self, include_sessions):
+        overview = self.overviews.get(include_sessions)
+        if overview is None:
+            overview = self.overviews[include_sessions] = OverviewMosaic(
+                lambda: self.overview_sources(include_sessions), self.encode_image, self)
+        overview.subscribe()
+        return overview.frame_buffer
+
+    def capture_tab(self, capture):
+        if not self.stream_enabled:
+            return
+        page = capture.record.view.page()
+        # A hidden view's page stops producing frames; keep it rendering
+        # (Qt 5.14+) while someone is watching.
+        if not capture.record.view.isVisible() and hasattr(page, 'setVisible'):
+            page.setVisible(True)
+        self.capture_frame(capture.record.tab, capture.frame_buffer, tab=capture.record.id)
+
+    def subscribe_tab(self, tab_id, interval):
+        record = self.tab_lifecycle.records.get(tab_id)
+        if record is None:
+            return None
+        capture = self.tab_captures.get(tab_id)
+        if capture is None:
+            capture = self.tab_captures[tab_id] = TabCapture(record, self.capture_tab, self,
+                                                             self.revealed_by_overview)
+        self.tab_lifecycle.activate(record.tab)
+        capture.subscribe(interval)
+        return capture.frame_buffer
+
+    def unsubscribe_tab(self, tab_id, interval):
+        capture = self.tab_captures.get(tab_id)
+        if capture is None:
+            return
+        capture.unsubscribe(interval)
+        if not capture.intervals:
+            del self.tab_captures[tab_id]
+
+    def stop_frame_server(self):
+        # Closing the pipe tells the frame server to exit before the segment goes.
+        self.frame_notifier.close()
+        try:
+            self.frame_server.wait(5)
+        except subprocess.TimeoutExpired:
+            self.frame_server.kill()
+        self.frame_ring.close()
+
+    def record_frame_timings(self, frame):
+        timings = frame.timings
+        self.latency_histograms['grab'].observe((timings['grab_end'] - timings['grab_start']) * 1000)
+        self.latency_histograms['encode'].observe((timings['encode_end'] - timings['grab_end']) * 1000)
+        self.latency_histograms['publish'].observe((timings['publish'] - timings['encode_end']) * 1000)
+
+    def record_frame_sent(self, frame, sent_at):
+        # Called from HTTP handler threads once a frame has been written to a socket.
+        self.latency_histograms['send'].observe((sent_at - frame.timings['publish']) * 1000)
+        self.latency_histograms['capture_to_wire'].observe((sent_at - frame.timings['grab_start']) * 1000)
+
+    def latency_report(self):
+        return {name: histogram.snapshot() for name, histogram in self.latency_histograms.items()}
 
     def toggle_stream(self):
         self.stream_enabled = not self.stream_enabled
         if self.stream_enabled:
             self.stream_timer.start(self.stream_interval)
-            self.status_bar.showMessage("Stream enabled", 2000)
+            self.show_status("Stream enabled", 2000)
         else:
             self.stream_timer.stop()
-            self.status_bar.showMessage("Stream disabled", 2000)
-        self.toggle_stream_action.setChecked(self.stream_enabled)
+            self.show_status("Stream disabled", 2000)
 
     def start_http_server(self):
         class BrowserHandler(http.server.SimpleHTTPRequestHandler):
@@ -392,22 +1689,376 @@ class WebBrowser(QMainWindow):
             def log_message(self, format, *args):
                 pass  # Suppress server logs
 
+            def write_frame_part(self, frame, skipped=0, live=True):
+                # Replayed frames (live=False) were captured before the client
+                # asked for them; their age says nothing about pipeline latency.
+                send_start = time.time()
+                self.wfile.write(b'--frame\r\n')
+                self.wfile.write(f'Content-Type: {frame.content_type}\r\n'.encode())
+                self.wfile.write(f'Content-Length: {len(frame.data)}\r\n'.encode())
+                self.wfile.write(f'X-Frame-Sequence: {frame.sequence}\r\n'.encode())
+                self.wfile.write(f'X-Frame-Timestamp: {frame.timestamp:.6f}\r\n'.encode())
+                timings = ','.join(f'{stage}={value:.6f}' for stage, value in frame.timings.items())
+                self.wfile.write(f'X-Frame-Timings: {timings}\r\n'.encode())
+                self.wfile.write(f'X-Frames-Skipped: {skipped}\r\n\r\n'.encode())
+                self.wfile.write(frame.data)
+                self.wfile.write(b'\r\n')
+                self.wfile.flush()
+                client = f'{self.client_address[0]}:{self.client_address[1]}'
+                self.browser.trace.complete('send', 'stream', send_start, time.time(),
+                                            sequence=frame.sequence, client=client)
+                self.browser.metrics.inc('stream_bytes_sent_total', len(frame.data))
+                self.browser.metrics.inc('stream_client_bytes_sent_total', len(frame.data), client=client)
+                if skipped:
+                    self.browser.metrics.inc('stream_frames_skipped_total', skipped, reason='slow_client')
+                if live and 'grab_start' in frame.timings:
+                    self.browser.record_frame_sent(frame, time.time())
+
+            def write_frame_event(self, frame, live=True):
+                payload = base64.b64encode(frame.data).decode()
+                self.wfile.write(f'id: {frame.sequence}\nevent: frame\n'.encode())
+                self.wfile.write(f'data: {frame.content_type};{frame.timestamp:.6f};{payload}\n\n'.encode())
+                self.wfile.flush()
+                self.browser.metrics.inc('stream_bytes_sent_total', len(frame.data))
+                if live and 'grab_start' in frame.timings:
+                    self.browser.record_frame_sent(frame, time.time())
+
+            def is_admin(self):
+                token = self.browser.admin_token
+                if not token:
+                    return False
+                supplied = self.headers.get('Authorization', '')
+                if supplied.startswith('Bearer '):
+                    supplied = supplied[len('Bearer '):]
+                else:
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    supplied = params.get('token', [''])[0]
+                return hmac.compare_digest(supplied.encode(), token.encode())
+
+            def send_json(self, data, status=200):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def run_on_gui_thread(self, *command, timeout=10.0):
+                # Raises TimeoutError (a 503, see do_GET) if the GUI thread
+                # has not answered in time; a command that runs after that
+                # is undone by finish_command rather than leaked.
+                result = {'done': threading.Event(), 'data': None, 'cancelled': False, 'lock': threading.Lock()}
+                self.browser.command_queue.put(command + (result,))
+                if not result['done'].wait(timeout):
+                    with result['lock']:
+                        if not result['done'].is_set():
+                            result['cancelled'] = True
+                            raise TimeoutError(f"GUI thread did not answer {command[0]} in time")
+                return result['data']
+
             def do_GET(self):
-                if self.path == '/stream':
+                try:
+                    self.route_request()
+                except TimeoutError as e:
+                    self.send_error(503, str(e))
+
+            def route_request(self):
+                # /s/<id>/... addresses a hosted session. The prefix is
+                # stripped and the rest is routed against that session
+                # exactly as it would be against the host. A session id is
+                # its only credential, so listing, creating and deleting
+                # sessions are admin routes.
+                self.prefix = ''
+                path = urllib.parse.urlparse(self.path).path
+                if path in ('/sessions', '/sessions/new', '/sessions/delete') and not self.is_admin():
+                    self.send_error(403)
+                elif path == '/sessions':
+                    self.send_json(self.run_on_gui_thread('sessions_report'))
+                elif path == '/sessions/new':
+                    session_id = self.run_on_gui_thread('create_session')
+                    if session_id is None:
+                        self.send_json({'error': 'Session limit reached'}, 503)
+                    else:
+                        self.send_json({'id': session_id, 'url': f'/s/{session_id}/'})
+                elif path == '/sessions/delete':
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    deleted = self.run_on_gui_thread('destroy_session', params.get('id', [''])[0])
+                    self.send_json({'deleted': bool(deleted)}, 200 if deleted else 404)
+                elif self.path.startswith('/s/'):
+                    session_id, slash, rest = self.path[len('/s/'):].partition('/')
+                    session = self.browser.sessions.get(session_id)
+                    if session is None:
+                        self.send_error(404, 'Unknown session')
+                    elif not slash:
+                        # The control page uses relative URLs, so it needs the trailing slash.
+                        self.send_response(301)
+                        self.send_header('Location', f'/s/{session_id}/')
+                        self.end_headers()
+                    else:
+                        self.browser = session
+                        self.prefix = f'/s/{session_id}'
+                        self.path = '/' + rest
+                        self.route()
+                else:
+                    self.route()
+
+            def route(self):
+                path = urllib.parse.urlparse(self.path).path
+                # A session shares the host's trace, stall report and page-load
+                # log, which hold every session's URLs; through /s/<id>/ they
+                # are admin routes like /admin/.
+                host_wide = self.prefix and path in ('/trace', '/page_loads', '/stalls')
+                if (path.startswith('/admin/') or host_wide) and not self.is_admin():
+                    self.send_error(403)
+                elif self.path.startswith('/admin/profile'):
+                    # /admin/profile?seconds=N&format=collapsed|pstats
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    try:
+                        seconds = float(params.get('seconds', ['10'])[0])
+                    except ValueError:
+                        seconds = math.nan
+                    if not math.isfinite(seconds):
+                        self.send_error(400, 'seconds must be a number')
+                        return
+                    seconds = min(max(seconds, 0.1), 120.0)
+                    output_format = params.get('format', ['collapsed'])[0]
+                    if output_format == 'pstats':
+                        try:
+                            body = self.browser.profile_gui_thread(seconds)
+                        except TimeoutError as e:
+                            self.send_error(504, str(e))
+                            return
+                        content_type = 'application/octet-stream'
+                        filename = 'browser.pstats'
+                    else:
+                        collapsed = self.browser.profiler.profile(seconds)
+                        body = collapsed.encode() if collapsed is not None else None
+                        content_type = 'text/plain'
+                        filename = 'browser.collapsed'
+                    if body is None:
+                        self.send_error(409, 'A profile is already running')
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/stream' or self.path.startswith('/stream?'):
+                    # /stream?from=N replays buffered frames after sequence N
+                    # before following the live stream. /stream?tab=<id>[&fps=N]
+                    # follows one tab whether or not it is current.
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    try:
+                        last_sequence = int(params['from'][0]) if 'from' in params else None
+                        tab_id = int(params['tab'][0]) if 'tab' in params else None
+                        fps = float(params.get('fps', ['10'])[0])
+                    except ValueError:
+                        self.send_error(400, 'from and tab must be integers, fps a number')
+                        return
+                    if last_sequence is not None and last_sequence < 0:
+                        self.send_error(400, 'from must not be negative')
+                        return
+                    if not math.isfinite(fps):
+                        self.send_error(400, 'fps must be a number')
+                        return
+                    frame_buffer = self.browser.frame_buffer
+                    subscription = None
+                    if tab_id is not None:
+                        fps = min(max(fps, 0.2), 60.0)
+                        subscription = (tab_id, int(1000 / fps))
+                        frame_buffer = self.run_on_gui_thread('subscribe_tab', *subscription)
+                        if frame_buffer is None:
+                            self.send_error(404, 'Unknown tab')
+                            return
                     self.send_response(200)
                     self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
                     self.end_headers()
+                    client = f'{self.client_address[0]}:{self.client_address[1]}'
+                    self.browser.metrics.inc('stream_active_subscribers')
+                    frame_buffer.attach()
                     try:
-                        while True:
-                            with self.browser.image_lock:
-                                self.browser.image_condition.wait()
-                                image_bytes = self.browser.latest_image
-                            self.wfile.write(b'--frame\r\n')
-                            self.wfile.write(b'Content-Type: image/jpeg\r\n\r\n')
-                            self.wfile.write(image_bytes)
-                            self.wfile.write(b'\r\n')
+                        if last_sequence is not None:
+                            frames, missed = frame_buffer.frames_since(last_sequence)
+                            for frame in frames:
+                                self.write_frame_part(frame, missed, live=False)
+                                missed = 0
+                                last_sequence = frame.sequence
+                        while not frame_buffer.closed:
+                            frame = frame_buffer.wait_for_newer(last_sequence, timeout=1.0)
+                            if frame is None:
+                                continue
+                            skipped = 0 if last_sequence is None else max(0, frame.sequence - last_sequence - 1)
+                            self.write_frame_part(frame, skipped)
+                            last_sequence = frame.sequence
                     except Exception as e:
                         print(f"Stream closed: {e}")
+                    finally:
+                        frame_buffer.detach()
+                        self.browser.metrics.inc('stream_active_subscribers', -1)
+                        self.browser.metrics.remove('stream_client_bytes_sent_total', client=client)
+                        if subscription:
+                            self.browser.command_queue.put(('unsubscribe_tab',) + subscription)
+                elif path == '/overview':
+                    # One grid of every tab's thumbnail; frames only go out when a tile changed.
+                    # Only an admin on the host also sees the tabs of hosted sessions.
+                    include_sessions = not self.prefix and self.is_admin()
+                    frame_buffer = self.run_on_gui_thread('subscribe_overview', include_sessions)
+                    if frame_buffer is None:
+                        self.send_error(503)
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                    self.end_headers()
+                    try:
+                        last_sequence = None
+                        frame = frame_buffer.latest()
+                        if frame is not None:
+                            self.write_frame_part(frame)
+                            last_sequence = frame.sequence
+                        while not frame_buffer.closed:
+                            frame = frame_buffer.wait_for_newer(last_sequence, timeout=1.0)
+                            if frame is None:
+                                continue
+                            self.write_frame_part(frame)
+                            last_sequence = frame.sequence
+                    except Exception as e:
+                        print(f"Overview stream closed: {e}")
+                    finally:
+                        self.browser.command_queue.put(('unsubscribe_overview', include_sessions))
+                elif self.path == '/events' or self.path.startswith('/events?'):
+                    # Server-sent events: one base64 frame per event; the event id is the
+                    # frame sequence, so EventSource reconnects resume via Last-Event-ID.
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    frame_buffer = self.browser.frame_buffer
+                    last_event_id = self.headers.get('Last-Event-ID') or params.get('from', [None])[0]
+                    try:
+                        last_sequence = int(last_event_id) if last_event_id is not None else None
+                    except ValueError:
+                        last_sequence = -1
+                    if last_sequence is not None and last_sequence < 0:
+                        self.send_error(400, 'Last-Event-ID must be a non-negative integer')
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Cache-Control', 'no-cache')
+                    self.end_headers()
+                    frame_buffer.attach()
+                    try:
+                        if last_sequence is not None:
+                            frames, _ = frame_buffer.frames_since(last_sequence)
+                            if frames:
+                                last_sequence = frames[-1].sequence
+                                self.write_frame_event(frames[-1], live=False)
+                        while not frame_buffer.closed:
+                            frame = frame_buffer.wait_for_newer(last_sequence, timeout=15.0)
+                            if frame is None:
+                                self.wfile.write(b': keepalive\n\n')
+                                self.wfile.flush()
+                                continue
+                            self.write_frame_event(frame)
+                            last_sequence = frame.sequence
+                    except Exception as e:
+                        print(f"Event stream closed: {e}")
+                    finally:
+                        frame_buffer.detach()
+                elif self.path == '/frame' or self.path.startswith('/frame?'):
+                    # Single-frame polling; /frame?after=N waits for a frame newer than N.
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    after = params.get('after', [None])[0]
+                    frame_buffer = self.browser.frame_buffer
+                    # Polls keep capture running; the first one after an idle
+                    # spell waits for a fresh frame rather than a stale one.
+                    was_idle = not frame_buffer.in_demand()
+                    frame_buffer.poll()
+                    if after is None:
+                        frame = frame_buffer.wait_for_newer(None, timeout=1.0) if was_idle else None
+                        frame = frame or frame_buffer.latest()
+                    elif not after.isdigit():
+                        self.send_error(400, 'after must be a non-negative integer')
+                        return
+                    else:
+                        frame = frame_buffer.wait_for_newer(int(after), timeout=5.0)
+                    if frame is None:
+                        self.send_response(204)
+                        self.end_headers()
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', frame.content_type)
+                    self.send_header('Content-Length', str(len(frame.data)))
+                    self.send_header('Cache-Control', 'no-store')
+                    self.send_header('X-Frame-Sequence', str(frame.sequence))
+                    self.send_header('X-Frame-Timestamp', f'{frame.timestamp:.6f}')
+                    self.send_header('X-Oldest-Sequence', str(self.browser.frame_buffer.oldest_sequence()))
+                    self.end_headers()
+                    self.wfile.write(frame.data)
+                    if 'grab_start' in frame.timings:
+                        self.browser.record_frame_sent(frame, time.time())
+                elif self.path == '/metrics':
+                    body = self.browser.metrics.render().encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == '/stalls':
+                    body = json.dumps(self.browser.watchdog.report()).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/trace' or self.path.startswith('/trace?'):
+                    # Chrome trace_event JSON; /trace?clear=1 empties the buffer after dumping.
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    clear = params.get('clear', ['0'])[0] == '1'
+                    body = json.dumps(self.browser.trace.dump(clear=clear)).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Disposition', 'attachment; filename="trace.json"')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/tabs':
+                    # Tab states and renderer usage are read on the GUI thread.
+                    body = json.dumps(self.run_on_gui_thread('tabs_report', timeout=5.0)).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/page_loads' or self.path.startswith('/page_loads?'):
+                    # p50/p95 load time per domain; ?domain=example.com narrows it down.
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    stats = self.browser.page_load_log.stats(params.get('domain', [None])[0])
+                    body = json.dumps(stats).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/blocker':
+                    body = json.dumps(self.browser.content_blocker.report()).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == '/admin/blocker/reload':
+                    # Parse off the GUI thread, then swap the rule set in one assignment.
+                    rules = self.browser.load_blocklist()
+                    self.browser.content_blocker.rules = rules
+                    for session in list(self.browser.sessions.values()):
+                        session.content_blocker.rules = rules
+                    self.send_response(204)
+                    self.end_headers()
+                elif self.path == '/latency':
+                    body = json.dumps(self.browser.latency_report()).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
                 elif self.path.startswith('/navigate?'):
                     query = self.path.split('?')[1]
                     params = urllib.parse.parse_qs(query)
@@ -415,7 +2066,16 @@ class WebBrowser(QMainWindow):
                     if url:
                         self.browser.command_queue.put(('navigate', url))
                     self.send_response(303)
-                    self.send_header('Location', '/')
+                    self.send_header('Location', self.prefix + '/')
+                    self.end_headers()
+                elif self.path.startswith('/low_bandwidth'):
+                    # /low_bandwidth?enabled=1 refuses images, media, fonts and workers
+                    # and stops animations; enabled=0 restores normal loading.
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    enabled = params.get('enabled', ['1'])[0] not in ('0', 'false', 'off')
+                    self.browser.command_queue.put(('low_bandwidth', enabled))
+                    self.send_response(303)
+                    self.send_header('Location', self.prefix + '/')
                     self.end_headers()
                 elif self.path.startswith('/scroll?'):
                     query = self.path.split('?')[1]
@@ -430,7 +2090,8 @@ class WebBrowser(QMainWindow):
                     params = urllib.parse.parse_qs(query)
                     key = urllib.parse.unquote(params.get('key', [''])[0])
                     modifiers = json.loads(urllib.parse.unquote(params.get('modifiers', ['{}'])[0]))
-                    self.browser.command_queue.put(('type', key, modifiers))
+                    mode = params.get('mode', ['js'])[0]
+                    self.browser.command_queue.put(('type', key, modifiers, mode))
                     self.send_response(200)
                     self.end_headers()
                 elif self.path.startswith('/click?'):
@@ -438,16 +2099,23 @@ class WebBrowser(QMainWindow):
                     params = urllib.parse.parse_qs(query)
                     x = int(params.get('x', [0])[0])
                     y = int(params.get('y', [0])[0])
-                    self.browser.command_queue.put(('click', x, y))
+                    mode = params.get('mode', ['js'])[0]
+                    self.browser.command_queue.put(('click', x, y, mode))
                     self.send_response(200)
                     self.end_headers()
+                elif self.path == '/new_tab' or self.path.startswith('/new_tab?'):
+                    params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    self.browser.command_queue.put(('new_tab', params.get('url', [None])[0]))
+                    self.send_response(303)
+                    self.send_header('Location', self.prefix + '/')
+                    self.end_headers()
                 elif self.path.startswith('/switch_tab?'):
                     query = self.path.split('?')[1]
                     params = urllib.parse.parse_qs(query)
                     direction = params.get('direction', ['next'])[0]
                     self.browser.command_queue.put(('switch_tab', direction))
                     self.send_response(303)
-                    self.send_header('Location', '/')
+                    self.send_header('Location', self.prefix + '/')
                     self.end_headers()
                 else:
                     super().do_GET()
@@ -457,7 +2125,7 @@ class WebBrowser(QMainWindow):
             kwargs['directory'] = self.server_dir
             return BrowserHandler(*args, **kwargs)
 
-        self.server = ThreadedTCPServer(("", self.server_port), handler_factory)
+        self.server = ThreadedTCPServer((self.server_host, self.server_port), handler_factory)
         server_thread = threading.Thread(target=self.server.serve_forever)
         server_thread.daemon = True
         server_thread.start()
@@ -502,26 +2170,160 @@ class WebBrowser(QMainWindow):
                 }}
             }})();
         """
-        current_browser.page().runJavaScript(js_code)
+        self.run_javascript(current_browser.page(), js_code, 'click')
+
+    def handle_native_click(self, x, y):
+        # Real Qt mouse events delivered to the render widget, instead of
+        # DOM events synthesized in JavaScript.
+        current_browser = self.get_current_browser()
+        if not current_browser:
+            return
+        target = current_browser.focusProxy() or current_browser
+        position = QPoint(x, y)
+        for event_type, buttons in ((QEvent.MouseButtonPress, Qt.LeftButton),
+                                    (QEvent.MouseButtonRelease, Qt.NoButton)):
+            event = QMouseEvent(event_type, position, Qt.LeftButton, buttons, Qt.NoModifier)
+            QApplication.sendEvent(target, event)
+
+    def handle_native_key_press(self, key, modifiers):
+        current_browser = self.get_current_browser()
+        if not current_browser:
+            return
+        target = current_browser.focusProxy() or current_browser
+        qt_modifiers = Qt.NoModifier
+        if modifiers.get('shift', False):
+            qt_modifiers |= Qt.ShiftModifier
+        if modifiers.get('ctrl', False):
+            qt_modifiers |= Qt.ControlModifier
+        if modifiers.get('alt', False):
+            qt_modifiers |= Qt.AltModifier
+        if key in NATIVE_KEYS:
+            qt_key = NATIVE_KEYS[key]
+            text = {'Enter': '\r', 'Backspace': '\b', 'Tab': '\t', ' ': ' '}.get(key, '')
+        elif len(key) == 1:
+            qt_key = ord(key.upper())
+            text = key
+        else:
+            return
+        current_browser.setFocus()
+        for event_type in (QEvent.KeyPress, QEvent.KeyRelease):
+            QApplication.sendEvent(target, QKeyEvent(event_type, qt_key, qt_modifiers, text))
 
     def process_commands(self):
         try:
             while not self.command_queue.empty():
                 command = self.command_queue.get_nowait()
-                if command[0] == 'navigate':
-                    self.load_url(command[1])
-                elif command[0] == 'scroll':
-                    self.handle_scroll(command[1], command[2])
-                elif command[0] == 'type':
-                    self.handle_key_press(command[1], command[2])
-                elif command[0] == 'click':
-                    self.handle_click(command[1], command[2])
-                elif command[0] == 'switch_tab':
-                    self.switch_tab(command[1])
+                self.metrics.inc('browser_commands_processed_total', type=command[0])
+                self.dispatch_command(command)
                 self.command_queue.task_done()
         except queue.Empty:
             pass
 
+    def dispatch_command(self, command):
+        with self.trace.span(command[0], 'command'):
+            if command[0] == 'navigate':
+                self.load_url(command[1])
+            elif command[0] == 'scroll':
+                self.handle_scroll(command[1], command[2])
+            elif command[0] == 'type':
+                if command[3:] == ('native',):
+                    self.handle_native_key_press(command[1], command[2])
+                else:
+                    self.handle_key_press(command[1], command[2])
+            elif command[0] == 'click':
+                if command[3:] == ('native',):
+                    self.handle_native_click(command[1], command[2])
+                else:
+                    self.handle_click(command[1], command[2])
+            elif command[0] == 'switch_tab':
+                self.switch_tab(command[1])
+            elif command[0] == 'new_tab':
+                self.add_new_tab(command[1])
+            elif command[0] == 'low_bandwidth':
+                self.set_low_bandwidth(command[1])
+            elif command[0] == 'clear_http_cache':
+                self.session_profile.clear_cache()
+                self.metrics.inc('browser_profile_cache_clears_total', reason=command[1])
+            elif command[0] == 'tabs_report':
+                self.finish_command(command[1], self.tab_lifecycle.report())
+            elif command[0] == 'profile':
+                self.start_gui_profile(command[1], command[2])
+            elif command[0] == 'subscribe_tab':
+                self.finish_command(command[3], self.subscribe_tab(command[1], command[2]),
+                                    lambda: self.unsubscribe_tab(command[1], command[2]))
+            elif command[0] == 'unsubscribe_tab':
+                self.unsubscribe_tab(command[1], command[2])
+            elif command[0] == 'subscribe_overview':
+                self.finish_command(command[2], self.subscribe_overview(command[1]),
+                                    lambda: self.unsubscribe_overview(command[1]))
+            elif command[0] == 'unsubscribe_overview':
+                self.unsubscribe_overview(command[1])
+            elif command[0] == 'create_session':
+                session_id = self.create_session()
+                self.finish_command(command[1], session_id, lambda: self.destroy_session(session_id))
+            elif command[0] == 'destroy_session':
+                self.finish_command(command[2], self.destroy_session(command[1]))
+            elif command[0] == 'sessions_report':
+                self.finish_command(command[1], self.session_report())
+
+    def finish_command(self, result, data, undo=None):
+        # Hands a result to the HTTP thread waiting in run_on_gui_thread. If
+        # it already gave up, the work is undone instead of left behind.
+        with result['lock']:
+            if not result['cancelled']:
+                result['data'] = data
+                result['done'].set()
+                return
+        if undo and data is not None:
+            undo()
+
+    def profile_gui_thread(self, seconds):
+        # Runs cProfile on the GUI thread for `seconds` and returns the pstats
+        # dump; called from an HTTP handler thread, which blocks until done.
+        # Returns None if a profile is already running and raises
+        # TimeoutError if the GUI thread never got to it. The profiler lock
+        # stays held until the GUI-side profiler is disabled, so a timed-out
+        # request cannot let a second one start on top of it.
+        if not self.profiler.lock.acquire(blocking=False):
+            return None
+        result = {'done': threading.Event(), 'data': None, 'cancelled': False, 'started': False,
+                  'lock': threading.Lock()}
+        self.command_queue.put(('profile', seconds, result))
+        if result['done'].wait(seconds + 30):
+            self.profiler.lock.release()
+            return result['data']
+        with result['lock']:
+            finished = result['done'].is_set()
+            # Too late to be useful; don't start it if it is still queued.
+            result['cancelled'] = not finished
+            # A running profile releases the lock itself in finish().
+            handed_off = result['started'] and not finished
+        if not handed_off:
+            self.profiler.lock.release()
+        if not finished:
+            raise TimeoutError(f"GUI thread did not finish a {seconds}s profile")
+        return result['data']
+
+    def start_gui_profile(self, seconds, result):
+        with result['lock']:
+            if result['cancelled']:
+                return
+            result['started'] = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def finish():
+            profiler.disable()
+            # Same bytes pstats.Stats.dump_stats would write to disk.
+            profiler.create_stats()
+            with result['lock']:
+                result['data'] = marshal.dumps(profiler.stats)
+                result['done'].set()
+                if result['cancelled']:
+                    self.profiler.lock.release()
+
+        QTimer.singleShot(int(seconds * 1000), finish)
+
     def handle_scroll(self, direction, amount):
         current_browser = self.get_current_browser()
         if not current_browser:
@@ -544,12 +2346,12 @@ class WebBrowser(QMainWindow):
         
         # Also run JavaScript to handle scrolling within the webpage
         if direction == 'up':
-            current_browser.page().runJavaScript(f"window.scrollBy(0, -{amount});")
+            self.run_javascript(current_browser.page(), f"window.scrollBy(0, -{amount});", 'scroll')
         elif direction == 'down':
-            current_browser.page().runJavaScript(f"window.scrollBy(0, {amount});")
+            self.run_javascript(current_browser.page(), f"window.scrollBy(0, {amount});", 'scroll')
         
         # Log scrolling for debugging
-        self.status_bar.showMessage(f"Scrolling {direction} by {amount}px", 1000)
+        self.show_status(f"Scrolling {direction} by {amount}px", 1000)
 
     def switch_tab(self, direction):
         current_index = self.tabs.currentIndex()
@@ -581,10 +2383,10 @@ class WebBrowser(QMainWindow):
             self.handle_scroll('down', 300)
             return
         elif key == 'Home':
-            current_browser.page().runJavaScript("window.scrollTo(0, 0);")
+            self.run_javascript(current_browser.page(), "window.scrollTo(0, 0);", 'scroll')
             return
         elif key == 'End':
-            current_browser.page().runJavaScript("window.scrollTo(0, document.body.scrollHeight);")
+            self.run_javascript(current_browser.page(), "window.scrollTo(0, document.body.scrollHeight);", 'scroll')
             return
         
         key_escaped = key.replace("'", "\\'")
@@ -663,12 +2465,226 @@ class WebBrowser(QMainWindow):
             }}
         }})();
         """
-        current_browser.page().runJavaScript(js_code)
+        self.run_javascript(current_browser.page(), js_code, 'type')
+
+class WebBrowser(BrowserCore, QMainWindow):
+    def __init__(self, **options):
+        super().__init__()
+        self.setup_core(**options)
+        self.initialize_ui()
+
+    def initialize_ui(self):
+        self.setWindowTitle("Python Web Browser")
+        self.setGeometry(100, 100, 1024, 768)
+
+        self.initialize_engine()
+
+        self.create_actions()
+        self.create_toolbar()
+
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+
+        self.add_new_tab()
+        self.setCentralWidget(self.tabs)
+
+        self.start_http_server()
+
+        self.show()
+
+    def create_tabs(self):
+        tabs = QTabWidget()
+        tabs.setTabsClosable(True)
+        tabs.tabCloseRequested.connect(self.close_tab)
+        return tabs
+
+    def show_status(self, message, timeout=0):
+        self.status_bar.showMessage(message, timeout)
+
+    def create_actions(self):
+        self.back_action = QAction("Back", self)
+        self.back_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_Left))
+        self.back_action.triggered.connect(self.navigate_back)
+
+        self.forward_action = QAction("Forward", self)
+        self.forward_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_Right))
+        self.forward_action.triggered.connect(self.navigate_forward)
+
+        self.reload_action = QAction("Reload", self)
+        self.reload_action.setShortcut(QKeySequence(Qt.Key_F5))
+        self.reload_action.triggered.connect(self.reload_page)
+
+        self.home_action = QAction("Home", self)
+        self.home_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_H))
+        self.home_action.triggered.connect(self.navigate_home)
+
+        self.new_tab_action = QAction("New Tab", self)
+        self.new_tab_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_T))
+        self.new_tab_action.triggered.connect(self.add_new_tab)
+
+        self.toggle_stream_action = QAction("Toggle Stream", self)
+        self.toggle_stream_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_A))
+        self.toggle_stream_action.triggered.connect(self.toggle_stream)
+        self.toggle_stream_action.setCheckable(True)
+        self.toggle_stream_action.setChecked(True)
+        
+        # Add scroll actions with keyboard shortcuts
+        self.scroll_up_action = QAction("Scroll Up", self)
+        self.scroll_up_action.setShortcut(QKeySequence(Qt.Key_Up))
+        self.scroll_up_action.triggered.connect(lambda: self.handle_scroll("up", 100))
+        
+        self.scroll_down_action = QAction("Scroll Down", self)
+        self.scroll_down_action.setShortcut(QKeySequence(Qt.Key_Down))
+        self.scroll_down_action.triggered.connect(lambda: self.handle_scroll("down", 100))
+        
+        self.page_up_action = QAction("Page Up", self)
+        self.page_up_action.setShortcut(QKeySequence(Qt.Key_PageUp))
+        self.page_up_action.triggered.connect(lambda: self.handle_scroll("up", 500))
+        
+        self.page_down_action = QAction("Page Down", self)
+        self.page_down_action.setShortcut(QKeySequence(Qt.Key_PageDown))
+        self.page_down_action.triggered.connect(lambda: self.handle_scroll("down", 500))
+
+    def create_toolbar(self):
+        navigation_bar = QToolBar("Navigation")
+        self.addToolBar(navigation_bar)
+
+        navigation_bar.addAction(self.back_action)
+        navigation_bar.addAction(self.forward_action)
+        navigation_bar.addAction(self.reload_action)
+        navigation_bar.addAction(self.home_action)
+        navigation_bar.addAction(self.new_tab_action)
+        navigation_bar.addAction(self.toggle_stream_action)
+
+        self.url_bar = QLineEdit()
+        self.url_bar.returnPressed.connect(self.navigate_to_url)
+        navigation_bar.addWidget(self.url_bar)
+
+        go_button = QPushButton("Go")
+        go_button.clicked.connect(self.navigate_to_url)
+        navigation_bar.addWidget(go_button)
+        
+        # Add scroll buttons to toolbar
+        scroll_bar = QToolBar("Scrolling")
+        self.addToolBar(scroll_bar)
+        
+        scroll_up_button = QPushButton("Scroll Up")
+        scroll_up_button.clicked.connect(lambda: self.handle_scroll("up", 100))
+        scroll_bar.addWidget(scroll_up_button)
+        
+        scroll_down_button = QPushButton("Scroll Down")
+        scroll_down_button.clicked.connect(lambda: self.handle_scroll("down", 100))
+        scroll_bar.addWidget(scroll_down_button)
+
+    def create_tab_widget(self):
+        # Use our custom ScrollableWebView instead of the standard QWebEngineView
+        browser = ScrollableWebView(metrics=self.metrics, profile=self.session_profile.profile)
+
+        # Create a scroll area to contain the browser
+        scroll_area = QScrollArea()
+        scroll_area.setWidget(browser)
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+
+        layout = QVBoxLayout()
+        layout.addWidget(scroll_area)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        tab = QWidget()
+        tab.setLayout(layout)
+        return tab, browser
+
+    def navigate_to_url(self):
+        url = self.url_bar.text()
+        self.load_url(url)
+
+    def update_url(self):
+        current_browser = self.get_current_browser()
+        if current_browser:
+            self.url_bar.setText(current_browser.url().toString())
+
+    def toggle_stream(self):
+        super().toggle_stream()
+        self.toggle_stream_action.setChecked(self.stream_enabled)
+
+class HeadlessEngine(BrowserCore, QObject):
+    # Same navigate, input and capture operations (and HTTP routes) as
+    # WebBrowser, but drives bare views: no QMainWindow, toolbars, line edit
+    # or status bar to build or repaint.
+    def __init__(self, viewport=(1024, 768), **options):
+        super().__init__()
+        self.viewport = viewport
+        self.setup_core(**options)
+        self.initialize_engine()
+        self.add_new_tab()
+        self.start_http_server()
+
+    def create_tabs(self):
+        return HeadlessTabs(self.viewport, self)
+
+class BrowserSession(BrowserCore, QObject):
+    # A light browser hosted in another engine's process: its own
+    # off-the-record profile, tabs, command queue, capture timer and frame
+    # buffer, served by the host's HTTP server under /s/<id>/. Chromium's
+    # browser process and the Python runtime are paid for once per host.
+    def __init__(self, host, session_id, viewport=(1024, 768)):
+        super().__init__()
+        self.session_id = session_id
+        self.created = time.time()
+        self.viewport = getattr(host, 'viewport', viewport)
+        self.setup_core(server_port=host.server_port, home_url=host.home_url,
+                        cache_size_mb=host.session_profile.profile.httpCacheMaximumSize() // (1024 * 1024),
+                        blocklist_path=host.blocklist_path, max_sessions=0, host=host,
+                        # Pre-warmed views would double the footprint of a light session.
+                        view_pool_size=0)
+        self.initialize_engine()
+        self.add_new_tab()
+
+    def create_tabs(self):
+        return HeadlessTabs(self.viewport, self)
+
+    def close_session(self):
+        # Close every buffer first so handler threads following this session
+        # (/stream, /events, /overview) end instead of waiting on it forever.
+        self.frame_buffer.close()
+        for capture in list(self.tab_captures.values()):
+            capture.stop()
+        self.tab_captures.clear()
+        for overview in self.overviews.values():
+            overview.frame_buffer.close()
+        for timer in self.findChildren(QTimer):
+            timer.stop()
+        for index in range(self.tabs.count()):
+            self.tabs.widget(index).deleteLater()
+        for tab, view in self.view_pool.entries:
+            tab.deleteLater()
+        # Deferred deletes run in posting order, so the pages go before the
+        # profile; the interceptor is handed to the profile to die with it.
+        self.content_blocker.setParent(self.session_profile.profile)
+        self.session_profile.profile.deleteLater()
+        self.deleteLater()
 
 if __name__ == "__main__":
     QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
-    browser = WebBrowser()
+    # BROWSER_PROFILE names an on-disk profile; unset means off-the-record.
+    # BROWSER_HEADLESS=1 runs the engine without any window chrome.
+    browser_class = HeadlessEngine if os.environ.get("BROWSER_HEADLESS") == "1" else WebBrowser
+    browser = browser_class(
+        server_port=int(os.environ.get("BROWSER_PORT", "8000")),
+        server_host=os.environ.get("BROWSER_HOST", ""),
+        # BROWSER_FRAME_SERVER_PORT serves /stream and /frame from a separate process.
+        frame_server_port=int(os.environ.get("BROWSER_FRAME_SERVER_PORT", "0")) or None,
+        max_sessions=int(os.environ.get("BROWSER_MAX_SESSIONS", "16")),
+        view_pool_size=int(os.environ.get("BROWSER_VIEW_POOL", "2")),
+        profile_name=os.environ.get("BROWSER_PROFILE") or None,
+        storage_path=os.environ.get("BROWSER_PROFILE_PATH") or None,
+        cache_size_mb=int(os.environ.get("BROWSER_CACHE_MB", "64")),
+        cache_cap_mb=int(os.environ.get("BROWSER_CACHE_CAP_MB", "256")),
+        memory_cap_mb=int(os.environ.get("BROWSER_MEMORY_CAP_MB", "0")) or None,
+        blocklist_path=os.environ.get("BROWSER_BLOCKLIST", os.path.join(os.getcwd(), "blocklist.txt")),
+    )
     print(f"Browser stream server running at http://localhost:{browser.server_port}")
     sys.exit(app.exec_())
     
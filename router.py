@@ -0,0 +1,355 @@
+import sys
+import os
+import time
+import json
+import hmac
+import secrets
+import argparse
+import threading
+import subprocess
+import http.client
+import http.server
+import socketserver
+import urllib.parse
+
+socketserver.TCPServer.allow_reuse_address = True
+
+# Per-hop headers that must not be forwarded by a proxy.
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+              'te', 'trailers', 'transfer-encoding', 'upgrade'}
+
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
+class Worker:
+    # One headless r.py process listening on a loopback port. Each worker has
+    # its own working directory so logs and static files never collide.
+    def __init__(self, index, port, runtime_dir, max_sessions=8, admin_token=""):
+        self.index = index
+        # Authorizes the router's /sessions/... calls on the worker.
+        self.admin_token = admin_token
+        self.max_sessions = max_sessions
+        self.port = port
+        self.directory = os.path.join(runtime_dir, f"worker-{index}")
+        self.process = None
+        self.sessions = set()
+        self.restarts = 0
+        self.started_at = None
+
+    def start(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        # Workers run in their own directory, so paths r.py would resolve
+        # against the working directory are made absolute here.
+        env = dict(os.environ, BROWSER_HEADLESS="1", BROWSER_PORT=str(self.port), BROWSER_HOST="127.0.0.1",
+                   BROWSER_MAX_SESSIONS=str(self.max_sessions), BROWSER_ADMIN_TOKEN=self.admin_token,
+                   # Only hosted sessions are used; the host's own tab needs no pool.
+                   BROWSER_VIEW_POOL="0",
+                   BROWSER_BLOCKLIST=os.path.abspath(os.environ.get("BROWSER_BLOCKLIST", "blocklist.txt")))
+        if os.environ.get("BROWSER_PROFILE_PATH"):
+            env["BROWSER_PROFILE_PATH"] = os.path.abspath(os.environ["BROWSER_PROFILE_PATH"])
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "r.py")
+        self.process = subprocess.Popen([sys.executable, script], cwd=self.directory, env=env)
+        self.started_at = time.time()
+
+    def request(self, path):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        try:
+            connection.request('GET', path, headers={'Authorization': f'Bearer {self.admin_token}'})
+            response = connection.getresponse()
+            return response.status, json.loads(response.read() or b'null')
+        finally:
+            connection.close()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+class Supervisor:
+    # Spawns the worker pool, creates each new session on the least-loaded
+    # worker (which hosts it under /s/<id>/) and restarts workers that die.
+    # A crash only loses that worker's sessions. Sessions with no open
+    # request for idle_timeout seconds are deleted, and one client address
+    # may hold at most sessions_per_client of them.
+    def __init__(self, workers, base_port, runtime_dir, sessions_per_worker=8, admin_token="",
+                 idle_timeout=1800.0, sessions_per_client=4):
+        # Workers need a token for session management even when the router's
+        # own admin routes are disabled (no token configured).
+        worker_token = admin_token or secrets.token_urlsafe(16)
+        self.workers = [Worker(i, base_port + i, runtime_dir, sessions_per_worker, worker_token)
+                        for i in range(workers)]
+        self.sessions_per_worker = sessions_per_worker
+        self.sessions = {}
+        self.idle_timeout = idle_timeout
+        self.sessions_per_client = sessions_per_client
+        # session id -> [open requests, time of the last request], and the
+        # client address that created it
+        self.activity = {}
+        self.owners = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        threading.Thread(target=self.monitor, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.stop()
+
+    def monitor(self):
+        while not self.stop_event.wait(1.0):
+            for session_id in self.idle_sessions():
+                print(f"Session {session_id} idle for {self.idle_timeout:.0f}s; deleting")
+                self.destroy_session(session_id)
+            for worker in self.workers:
+                if worker.alive():
+                    continue
+                code = worker.process.returncode if worker.process else None
+                print(f"Worker {worker.index} exited with {code}; restarting")
+                with self.lock:
+                    for session_id in worker.sessions:
+                        self.forget(session_id)
+                    worker.sessions.clear()
+                worker.restarts += 1
+                worker.start()
+
+    def idle_sessions(self):
+        cutoff = time.time() - self.idle_timeout
+        with self.lock:
+            return [session_id for session_id, (open_requests, last_access) in self.activity.items()
+                    if open_requests == 0 and last_access < cutoff]
+
+    def client_at_limit(self, client):
+        # Called with self.lock held by create_session.
+        owned = sum(1 for owner in self.owners.values() if owner == client)
+        return client is not None and owned >= self.sessions_per_client
+
+    def forget(self, session_id):
+        # Called with self.lock held.
+        self.sessions.pop(session_id, None)
+        self.activity.pop(session_id, None)
+        self.owners.pop(session_id, None)
+
+    def create_session(self, client=None):
+        # `client` is the address of a public visitor; admin calls pass None
+        # and are not limited per client.
+        with self.lock:
+            if self.client_at_limit(client):
+                return None
+            candidates = [worker for worker in self.workers
+                          if worker.alive() and len(worker.sessions) < self.sessions_per_worker]
+            if not candidates:
+                return None
+            worker = min(candidates, key=lambda worker: len(worker.sessions))
+            # Hold the slot while the worker builds the session.
+            placeholder = object()
+            worker.sessions.add(placeholder)
+            self.owners[placeholder] = client
+        try:
+            status, data = worker.request('/sessions/new')
+        except (OSError, ValueError) as e:
+            print(f"Worker {worker.index} could not create a session: {e}")
+            status, data = None, None
+        with self.lock:
+            worker.sessions.discard(placeholder)
+            self.owners.pop(placeholder)
+            if status != 200:
+                return None
+            worker.sessions.add(data['id'])
+            self.sessions[data['id']] = worker
+            self.activity[data['id']] = [0, time.time()]
+            self.owners[data['id']] = client
+            return data['id']
+
+    def destroy_session(self, session_id):
+        with self.lock:
+            worker = self.sessions.get(session_id)
+            if worker is None:
+                return False
+            self.forget(session_id)
+            worker.sessions.discard(session_id)
+        # The worker drops the session's tabs and its off-the-record profile,
+        # so nothing of it reaches the next session placed on that worker.
+        try:
+            status, _ = worker.request(f'/sessions/delete?id={urllib.parse.quote(session_id)}')
+        except (OSError, ValueError) as e:
+            status = e
+        if status != 200:
+            print(f"Worker {worker.index} did not delete session {session_id}: {status}")
+        return True
+
+    def begin_request(self, session_id):
+        # Returns the session's worker and counts the request as open, so a
+        # long-lived /stream keeps its session from being reaped.
+        with self.lock:
+            worker = self.sessions.get(session_id)
+            if worker is not None:
+                self.activity[session_id][0] += 1
+                self.activity[session_id][1] = time.time()
+            return worker
+
+    def end_request(self, session_id):
+        with self.lock:
+            activity = self.activity.get(session_id)
+            if activity is not None:
+                activity[0] -= 1
+                activity[1] = time.time()
+
+    def report(self):
+        with self.lock:
+            return [{
+                'index': worker.index,
+                'port': worker.port,
+                'pid': worker.process.pid if worker.process else None,
+                'alive': worker.alive(),
+                'restarts': worker.restarts,
+                'sessions': sorted(session for session in worker.sessions if isinstance(session, str)),
+            } for worker in self.workers]
+
+class RouterHandler(http.server.BaseHTTPRequestHandler):
+    supervisor = None
+    # Admin routes are disabled unless a token is configured.
+    admin_token = ""
+
+    def log_message(self, format, *args):
+        pass
+
+    def is_admin(self):
+        if not self.admin_token:
+            return False
+        supplied = self.headers.get('Authorization', '')
+        if supplied.startswith('Bearer '):
+            supplied = supplied[len('Bearer '):]
+        else:
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            supplied = params.get('token', [''])[0]
+        return hmac.compare_digest(supplied.encode(), self.admin_token.encode())
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # `/` is the public way in: each visit gets a fresh session. Session
+        # ids are the only credential for /s/<id>/, so everything that lists,
+        # creates by id or deletes sessions needs the admin token.
+        path = urllib.parse.urlparse(self.path).path
+        if path in ('/sessions/new', '/sessions/delete', '/workers') and not self.is_admin():
+            self.send_error(403)
+        elif self.path == '/':
+            client = self.client_address[0]
+            session_id = self.supervisor.create_session(client)
+            if session_id is None:
+                with self.supervisor.lock:
+                    at_limit = self.supervisor.client_at_limit(client)
+                if at_limit:
+                    self.send_error(429, 'Too many sessions from this address')
+                else:
+                    self.send_error(503, 'No browser worker available')
+                return
+            self.send_response(303)
+            self.send_header('Location', f'/s/{session_id}/')
+            self.end_headers()
+        elif path == '/sessions/new':
+            session_id = self.supervisor.create_session()
+            if session_id is None:
+                self.send_json({'error': 'No browser worker available'}, 503)
+            else:
+                self.send_json({'id': session_id, 'url': f'/s/{session_id}/'})
+        elif path == '/sessions/delete':
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            deleted = self.supervisor.destroy_session(params.get('id', [''])[0])
+            self.send_json({'deleted': deleted}, 200 if deleted else 404)
+        elif path == '/workers':
+            self.send_json(self.supervisor.report())
+        elif self.path.startswith('/s/'):
+            self.proxy()
+        else:
+            self.send_error(404)
+
+    def proxy(self):
+        # Workers route /s/<id>/... themselves, so the path goes through as is.
+        session_id = self.path[len('/s/'):].partition('/')[0]
+        worker = self.supervisor.begin_request(session_id)
+        if worker is None:
+            self.send_error(404, 'Unknown session')
+            return
+        try:
+            self.forward(worker)
+        finally:
+            self.supervisor.end_request(session_id)
+
+    def forward(self, worker):
+        try:
+            # No timeout: /stream and /events stay open for the life of the viewer.
+            connection = http.client.HTTPConnection('127.0.0.1', worker.port)
+            headers = {name: value for name, value in self.headers.items()
+                       if name.lower() not in HOP_BY_HOP and name.lower() != 'host'}
+            connection.request('GET', self.path, headers=headers)
+            response = connection.getresponse()
+        except OSError as e:
+            self.send_error(502, f'Worker {worker.index} unavailable: {e}')
+            return
+        self.send_response(response.status, response.reason)
+        for name, value in response.getheaders():
+            if name.lower() not in HOP_BY_HOP:
+                self.send_header(name, value)
+        self.end_headers()
+        try:
+            while True:
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Front-end router for a pool of r.py browser workers")
+    parser.add_argument("--port", type=int, default=8000, help="public port for the router")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="browser worker processes")
+    parser.add_argument("--base-port", type=int, default=9100, help="first loopback port for workers")
+    parser.add_argument("--sessions-per-worker", type=int, default=8)
+    parser.add_argument("--idle-timeout", type=float, default=1800.0,
+                        help="seconds without a request before a session is deleted")
+    parser.add_argument("--sessions-per-client", type=int, default=4,
+                        help="sessions one client address may open through /")
+    parser.add_argument("--runtime-dir", default=os.path.join(os.getcwd(), "workers"))
+    parser.add_argument("--admin-token", default=os.environ.get("BROWSER_ADMIN_TOKEN", ""),
+                        help="token for /sessions/... and /workers (default: $BROWSER_ADMIN_TOKEN)")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.workers, args.base_port, args.runtime_dir, args.sessions_per_worker,
+                            args.admin_token, args.idle_timeout, args.sessions_per_client)
+    supervisor.start()
+    RouterHandler.supervisor = supervisor
+    RouterHandler.admin_token = args.admin_token
+    server = ThreadedTCPServer(("", args.port), RouterHandler)
+    print(f"Router running at http://localhost:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        supervisor.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os
+import time
+import zlib
+import struct
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+class PngStripWriter:
+    # Writes an 8-bit RGB PNG to disk a strip of rows at a time. Only the
+    # compressor's window and one pending IDAT chunk are held in memory, so
+    # the image can be far larger than any bitmap we could allocate.
+    def __init__(self, path, width, height, chunk_size=256 * 1024):
+        self.file = open(path, "wb")
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.chunk_size = chunk_size
+        self.compressor = zlib.compressobj(6)
+        self.pending = []
+        self.pending_bytes = 0
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def write_chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+
+    def write_rows(self, rows):
+        # `rows` yields width * 3 bytes of RGB per row.
+        for row in rows:
+            if self.rows_written >= self.height:
+                break
+            self.queue(self.compressor.compress(b"\x00" + row))
+            self.rows_written += 1
+
+    def queue(self, data):
+        if not data:
+            return
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= self.chunk_size:
+            self.write_chunk(b"IDAT", b"".join(self.pending))
+            self.pending = []
+            self.pending_bytes = 0
+
+    def close(self):
+        # Pads with black rows if the page came up short, so the PNG stays valid.
+        blank = bytes(self.width * 3)
+        while self.rows_written < self.height:
+            self.write_rows([blank])
+        self.pending.append(self.compressor.flush())
+        self.write_chunk(b"IDAT", b"".join(self.pending))
+        self.write_chunk(b"IEND", b"")
+        self.file.close()
+
+class ScreenshotStore:
+    # Content-addressed screenshot storage. Encoded images are stored once
+    # under blobs/<xx>/<sha256>.png, however many times they are captured; the
+    # manifest (a SQLite database) maps every capture's timestamp and URL to
+    # its blob. Retention evicts least-recently-captured blobs beyond
+    # max_bytes and captures older than max_age seconds, a bounded batch at a
+    # time after each capture, so no single call walks the whole store.
+    # Screenshots imported from older versions predate the age limit and are
+    # never expired by it; only the byte cap applies to them.
+    def __init__(self, root, max_bytes=None, max_age=None, batch=16):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.batch = batch
+        self.lock = threading.Lock()
+        if not os.path.exists(root):
+            os.makedirs(root)
+        # Shared by capture writers and HTTP handler threads.
+        self.connection = sqlite3.connect(os.path.join(root, "manifest.sqlite3"), check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS captures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                digest TEXT NOT NULL REFERENCES blobs (digest),
+                url TEXT,
+                captured_at REAL NOT NULL,
+                legacy INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used);
+            CREATE INDEX IF NOT EXISTS captures_digest ON captures (digest);
+            CREATE INDEX IF NOT EXISTS captures_captured_at ON captures (captured_at);
+        """)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(captures)")]
+        if "legacy" not in columns:
+            self.connection.execute("ALTER TABLE captures ADD COLUMN legacy INTEGER NOT NULL DEFAULT 0")
+            self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    @staticmethod
+    def blob_name(digest):
+        return f"blobs/{digest[:2]}/{digest}.png"
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, self.blob_name(digest))
+
+    def add(self, data, url=None, captured_at=None, legacy=False):
+        def write(path):
+            # Write then rename, so a half-written blob is never served. The
+            # temporary name is unique, as other processes may share the store.
+            handle, temporary = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+            with os.fdopen(handle, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+
+        return self.record(hashlib.sha256(data).hexdigest(), len(data), write, url, captured_at, legacy)
+
+    def temporary_path(self):
+        # Inside the store, so add_file can rename rather than copy.
+        handle, path = tempfile.mkstemp(suffix=".png.tmp", dir=self.root)
+        os.close(handle)
+        return path
+
+    def add_file(self, source, url=None, captured_at=None):
+        # For images streamed to disk: the file is moved into the store, or
+        # deleted if an identical blob already exists.
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        try:
+            return self.record(digest.hexdigest(), os.path.getsize(source),
+                               lambda path: os.replace(source, path), url, captured_at)
+        finally:
+            if os.path.exists(source):
+                os.remove(source)
+
+    def record(self, digest, size, write, url, captured_at, legacy=False):
+        captured_at = captured_at or time.time()
+        with self.lock:
+            known = self.connection.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if known:
+                self.connection.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (captured_at, digest))
+            else:
+                path = self.blob_path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write(path)
+                # Another process (a batch shard) may have stored the same
+                # blob since the SELECT; identical content, so either row will do.
+                inserted = self.connection.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, size, last_used) VALUES (?, ?, ?)",
+                    (digest, size, captured_at)).rowcount
+                self.total_bytes += size if inserted else 0
+            self.connection.execute("INSERT INTO captures (digest, url, captured_at, legacy) VALUES (?, ?, ?, ?)",
+                                    (digest, url, captured_at, int(legacy)))
+            # An import runs without retention, so it cannot evict what it just brought in.
+            if not legacy:
+                self.enforce_retention()
+            self.connection.commit()
+        return digest
+
+    def enforce_retention(self):
+        # Called with the lock held; does at most one batch of each kind.
+        if self.max_age:
+            cutoff = time.time() - self.max_age
+            expired = self.connection.execute(
+                "SELECT id, digest FROM captures WHERE captured_at < ? AND NOT legacy ORDER BY captured_at LIMIT ?",
+                (cutoff, self.batch)).fetchall()
+            self.connection.executemany("DELETE FROM captures WHERE id = ?", [(row[0],) for row in expired])
+            for digest in {row[1] for row in expired}:
+                if not self.connection.execute("SELECT 1 FROM captures WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+                    self.remove_blob(digest)
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            oldest = self.connection.execute(
+                "SELECT digest FROM blobs ORDER BY last_used LIMIT ?", (self.batch,)).fetchall()
+            for (digest,) in oldest:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.connection.execute("DELETE FROM captures WHERE digest = ?", (digest,))
+                self.remove_blob(digest)
+
+    def remove_blob(self, digest):
+        size = self.connection.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if size is None:
+            return
+        self.connection.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        self.total_bytes -= size[0]
+        try:
+            os.remove(self.blob_path(digest))
+        except OSError:
+            pass
+
+    def import_legacy(self, directory, exclude=("live_view.png",)):
+        # Moves loose <name>.png screenshots from older versions into the
+        # store, using the file's mtime as the capture time. Each original is
+        # removed only once its capture is committed.
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if not filename.endswith(".png") or filename in exclude or not os.path.isfile(path):
+                continue
+            # One unreadable or locked file is left in place, not the whole import.
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                self.add(data, None, os.path.getmtime(path), legacy=True)
+                os.remove(path)
+            except OSError as e:
+                print(f"Could not import {path}: {e}")
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM captures").fetchone()[0]
+
+    def page(self, number, per_page):
+        # Most recent captures first, as (blob path relative to root, url, captured_at).
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT digest, url, captured_at FROM captures ORDER BY captured_at DESC, id DESC LIMIT ? OFFSET ?",
+                (per_page, (number - 1) * per_page)).fetchall()
+        return [(self.blob_name(digest), url, captured_at) for digest, url, captured_at in rows]
+
+    def stats(self):
+        with self.lock:
+            captures = self.connection.execute("SELECT COUNT(*) FROM captures").fetchone()[0]
+            blobs = self.connection.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        return {'captures': captures, 'blobs': blobs, 'bytes': self.total_bytes}
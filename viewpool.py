@@ -0,0 +1,40 @@
+import collections
+
+from PyQt5.QtCore import QUrl, QTimer
+
+class ViewPool:
+    # Keeps a few tabs (container widget plus web view) built and parked on
+    # about:blank, so opening a tab skips widget construction and renderer
+    # start-up. Refills one view at a time, only while the GUI thread is idle.
+    def __init__(self, factory, size=2, refill_delay=500, is_idle=None):
+        self.factory = factory
+        self.size = size
+        self.refill_delay = refill_delay
+        self.is_idle = is_idle or (lambda: True)
+        self.entries = collections.deque()
+        self.refill_pending = False
+
+    def take(self):
+        # Returns (tab, view) and whether it came from the pool.
+        hit = bool(self.entries)
+        entry = self.entries.popleft() if hit else self.factory()
+        self.schedule_refill()
+        return entry, hit
+
+    def schedule_refill(self):
+        if self.refill_pending or len(self.entries) >= self.size:
+            return
+        self.refill_pending = True
+        QTimer.singleShot(self.refill_delay, self.refill_one)
+
+    def refill_one(self):
+        self.refill_pending = False
+        if len(self.entries) >= self.size:
+            return
+        if not self.is_idle():
+            self.schedule_refill()
+            return
+        tab, view = self.factory()
+        view.load(QUrl("about:blank"))
+        self.entries.append((tab, view))
+        self.schedule_refill()
@@ -4,14 +4,224 @@ import threading
 import time
 import http.server
 import socketserver
+import queue
+import html
+import urllib.parse
 from datetime import datetime
-from PyQt5.QtCore import QUrl, Qt, QTimer, QSize
+from PyQt5.QtCore import QUrl, Qt, QTimer, QSize, QObject, QBuffer, pyqtSignal
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QToolBar, 
                              QLineEdit, QPushButton, QAction, QVBoxLayout, 
-                             QHBoxLayout, QWidget, QTabWidget, QMenu, QStatusBar,
-                             QMessageBox)
+                             QHBoxLayout, QWidget, QTabWidget, QMenu, QStatusBar)
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtGui import QIcon, QKeySequence, QPixmap, QImage
+from screenshotstore import ScreenshotStore, PngStripWriter
+
+class ScreenshotWriter(QObject):
+    """Encodes screenshots and adds them to the store on a background thread"""
+    
+    # Emitted from the writer thread with the blob path; Qt queues it onto the GUI thread
+    saved = pyqtSignal(str)
+    
+    def __init__(self, store, legacy_dir=None):
+        super().__init__()
+        self.store = store
+        self.legacy_dir = legacy_dir
+        self.jobs = queue.Queue()
+        # Move screenshots saved by older versions into the store first; as a
+        # job, a failed import is logged like any other instead of killing the thread
+        if legacy_dir:
+            self.jobs.put(lambda: self.store.import_legacy(legacy_dir))
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        
+    def submit(self, image, url):
+        # QImage (unlike QPixmap) may be used off the GUI thread
+        captured_at = time.time()
+        self.jobs.put(lambda: self.save(image, url, captured_at))
+        
+    def run_later(self, job):
+        """Run job on the writer thread once everything queued before it is done"""
+        self.jobs.put(job)
+        
+    def close(self):
+        """Write out everything still queued, then stop the thread (connected to aboutToQuit)"""
+        self.jobs.put(None)
+        self.thread.join()
+        
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception as e:
+                print(f"Screenshot writer job failed: {e}")
+                
+    def save(self, image, url, captured_at):
+        buffer = QBuffer()
+        buffer.open(QBuffer.ReadWrite)
+        if image.save(buffer, "PNG"):
+            digest = self.store.add(bytes(buffer.data()), url, captured_at)
+            self.saved.emit(self.store.blob_name(digest))
+        else:
+            print("Could not encode screenshot")
+
+class FullPageCapture(QObject):
+    """Captures a whole page by stepping the viewport and stitching the tiles"""
+    
+    # Emitted with the blob path, or an empty string if nothing was captured
+    finished = pyqtSignal(str)
+    
+    MEASURE_JS = """
+        [Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0),
+         window.innerHeight, window.scrollY]
+    """
+    
+    def __init__(self, view, writer, max_height=100000, settle_interval=50, settle_timeout=2000,
+                 step_timeout=10000):
+        super().__init__()
+        self.view = view
+        self.writer = writer
+        self.store = writer.store
+        self.max_height = max_height
+        self.settle_interval = settle_interval
+        self.settle_timeout = settle_timeout
+        self.png = None
+        self.done = False
+        # Fires if a step (a JavaScript callback or a settle check) stalls,
+        # e.g. because the renderer went away
+        self.watchdog = QTimer(self)
+        self.watchdog.setSingleShot(True)
+        self.watchdog.setInterval(step_timeout)
+        self.watchdog.timeout.connect(lambda: self.cancel("timed out"))
+        
+    def start(self):
+        self.url = self.view.url().toString()
+        # Closing the tab or leaving the page abandons the capture
+        self.view.destroyed.connect(self.view_destroyed)
+        self.view.loadStarted.connect(self.navigated)
+        self.watchdog.start()
+        self.view.page().runJavaScript(self.MEASURE_JS, self.measured)
+        
+    def view_destroyed(self):
+        self.view = None
+        self.cancel("tab closed")
+        
+    def navigated(self):
+        self.cancel("page navigated away")
+        
+    def measured(self, result):
+        if self.done:
+            return
+        if not result:
+            self.cancel("could not measure the page")
+            return
+        document_height, self.viewport_height, self.original_scroll = (int(value) for value in result)
+        self.document_height = min(document_height, self.max_height)
+        self.next_y = 0
+        self.scroll_to_next()
+        
+    def scroll_to_next(self):
+        if self.next_y >= self.document_height or self.viewport_height <= 0:
+            self.finish()
+            return
+        self.watchdog.start()
+        self.view.page().runJavaScript(f"window.scrollTo(0, {self.next_y}); window.scrollY", self.scrolled)
+        
+    def scrolled(self, scroll_y):
+        if self.done:
+            return
+        self.watchdog.start()
+        self.scroll_y = int(scroll_y or 0)
+        self.previous_grab = None
+        self.settle_started = time.time()
+        QTimer.singleShot(self.settle_interval, self.check_settled)
+        
+    def check_settled(self):
+        # The tile is taken once two consecutive grabs are identical, rather
+        # than after a fixed sleep; settle_timeout bounds animated pages
+        if self.done:
+            return
+        image = self.view.grab().toImage()
+        waited = (time.time() - self.settle_started) * 1000
+        if image != self.previous_grab and waited < self.settle_timeout:
+            self.previous_grab = image
+            QTimer.singleShot(self.settle_interval, self.check_settled)
+            return
+        self.write_tile(image)
+        self.next_y += self.viewport_height
+        self.scroll_to_next()
+        
+    def write_tile(self, image):
+        # Only the crop is worked out here; row copying and compression run
+        # on the writer thread, in order, so the GUI never waits on zlib
+        scale = image.height() / self.viewport_height
+        if self.png is None:
+            self.png = {'path': None, 'strip': None}
+            width, height = image.width(), int(round(self.document_height * scale))
+            self.writer.run_later(lambda png=self.png: self.open_png(png, width, height))
+        # The browser clamps the last scroll, so new rows can start part-way down the tile
+        top = int(round((self.next_y - self.scroll_y) * scale))
+        count = int(round(min(self.viewport_height, self.document_height - self.next_y) * scale))
+        count = max(0, min(count, image.height() - top))
+        self.writer.run_later(lambda png=self.png: self.append_rows(png, image, top, count))
+        
+    def open_png(self, png, width, height):
+        png['path'] = self.store.temporary_path()
+        png['strip'] = PngStripWriter(png['path'], width, height)
+        
+    def append_rows(self, png, image, top, count):
+        strip = png['strip']
+        if strip is None:
+            return
+        image = image.convertToFormat(QImage.Format_RGB888)
+        stride = image.bytesPerLine()
+        row_bytes = min(image.width(), strip.width) * 3
+        padding = bytes(strip.width * 3 - row_bytes)
+        data = memoryview(image.constBits().asstring(stride * image.height()))
+        strip.write_rows(
+            bytes(data[(top + row) * stride:(top + row) * stride + row_bytes]) + padding for row in range(count))
+        
+    def store_png(self, png, url):
+        # Writer thread: finish the file and move it into the store
+        if png['strip'] is None:
+            self.finished.emit("")
+            return
+        png['strip'].close()
+        digest = self.store.add_file(png['path'], url)
+        self.finished.emit(self.store.blob_name(digest))
+        
+    def discard_png(self, png):
+        # Writer thread: drop a half-written file so no .png.tmp is left behind
+        if png['strip'] is not None:
+            png['strip'].file.close()
+        if png['path'] and os.path.exists(png['path']):
+            os.remove(png['path'])
+        
+    def finish(self):
+        self.stop()
+        self.view.page().runJavaScript(f"window.scrollTo(0, {self.original_scroll})")
+        if self.png is None:
+            self.finished.emit("")
+            return
+        self.writer.run_later(lambda png=self.png, url=self.url: self.store_png(png, url))
+        
+    def cancel(self, reason):
+        if self.done:
+            return
+        print(f"Full-page screenshot of {self.url} abandoned: {reason}")
+        self.stop()
+        if self.png is not None:
+            self.writer.run_later(lambda png=self.png: self.discard_png(png))
+        self.finished.emit("")
+        
+    def stop(self):
+        self.done = True
+        self.watchdog.stop()
+        if self.view is not None:
+            self.view.destroyed.disconnect(self.view_destroyed)
+            self.view.loadStarted.disconnect(self.navigated)
 
 class WebBrowser(QMainWindow):
     
@@ -29,6 +239,15 @@ class WebBrowser(QMainWindow):
         if not os.path.exists(self.screenshot_dir):
             os.makedirs(self.screenshot_dir)
             
+        # Screenshots are encoded and stored off the GUI thread. Identical
+        # captures share one blob; the store keeps at most 512 MB and 30 days.
+        self.screenshot_store = ScreenshotStore(self.screenshot_dir, max_bytes=512 * 1024 * 1024,
+                                                max_age=30 * 24 * 3600)
+        self.screenshot_writer = ScreenshotWriter(self.screenshot_store, legacy_dir=self.screenshot_dir)
+        self.screenshot_writer.saved.connect(self.screenshot_saved)
+        QApplication.instance().aboutToQuit.connect(self.screenshot_writer.close)
+        self.full_page_capture = None
+            
         # Initialize HTTP server for serving screenshots
         self.server_port = 8000
         self.start_http_server()
@@ -96,6 +315,11 @@ class WebBrowser(QMainWindow):
         self.screenshot_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_S))
         self.screenshot_action.triggered.connect(self.take_screenshot)
         
+        # Full-page screenshot action
+        self.full_page_action = QAction("Full-Page Screenshot", self)
+        self.full_page_action.setShortcut(QKeySequence(Qt.CTRL + Qt.SHIFT + Qt.Key_S))
+        self.full_page_action.triggered.connect(self.take_full_page_screenshot)
+        
         # Toggle Auto-Screenshot action
         self.auto_screenshot_action = QAction("Toggle Auto-Screenshot", self)
         self.auto_screenshot_action.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_A))
@@ -114,6 +338,7 @@ class WebBrowser(QMainWindow):
         navigation_bar.addAction(self.home_action)
         navigation_bar.addAction(self.new_tab_action)
         navigation_bar.addAction(self.screenshot_action)
+        navigation_bar.addAction(self.full_page_action)
         navigation_bar.addAction(self.auto_screenshot_action)
         
         # Add URL bar
@@ -154,7 +379,11 @@ class WebBrowser(QMainWindow):
     
     def close_tab(self, index):
         if self.tabs.count() > 1:
+            # removeTab only detaches the widget; deleting it frees the page
+            # and lets anything watching the view (a full-page capture) see it go
+            tab = self.tabs.widget(index)
             self.tabs.removeTab(index)
+            tab.deleteLater()
         else:
             # Don't close the last tab, just clear it
             current_browser = self.get_current_browser()
@@ -205,45 +434,45 @@ class WebBrowser(QMainWindow):
             self.status_bar.showMessage("Done", 2000)  # Show "Done" for 2 seconds
             
     def take_screenshot(self):
-        # Get current browser widget
-        current_browser = self.get_current_browser()
-        
-        # Create a unique filename based on timestamp and URL
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        url_part = current_browser.url().host().replace(".", "_")
-        if not url_part:
-            url_part = "homepage"
-        filename = f"screenshot_{url_part}_{timestamp}.png"
-        filepath = os.path.join(self.screenshot_dir, filename)
-        
         # Take screenshot after a short delay to ensure page is fully rendered
-        QTimer.singleShot(500, lambda: self._capture_screenshot(filepath))
+        QTimer.singleShot(500, self._capture_screenshot)
         
-    def _capture_screenshot(self, filepath):
-        # Capture the current tab
+    def _capture_screenshot(self):
+        # Capture the current tab; PNG compression happens on the writer thread
         current_tab = self.tabs.currentWidget()
-        pixmap = current_tab.grab()
-        
-        # Save the screenshot
-        pixmap.save(filepath)
-        
-        # Update status bar
-        self.status_bar.showMessage(f"Screenshot saved: {filepath}", 3000)
-        
-        # Update the index.html file
-        self.update_screenshot_index()
+        image = current_tab.grab().toImage()
+        url = self.get_current_browser().url().toString()
+        self.screenshot_writer.submit(image, url)
+        self.status_bar.showMessage("Saving screenshot...", 3000)
+        
+    def take_full_page_screenshot(self):
+        """Capture the whole document, not just the visible part"""
+        if self.full_page_capture is not None:
+            self.status_bar.showMessage("A full-page screenshot is already in progress", 3000)
+            return
+        self.full_page_capture = FullPageCapture(self.get_current_browser(), self.screenshot_writer)
+        self.full_page_capture.finished.connect(self.full_page_screenshot_saved)
+        self.status_bar.showMessage("Capturing full page...")
+        self.full_page_capture.start()
+        
+    def full_page_screenshot_saved(self, blob_name):
+        self.full_page_capture = None
+        if blob_name:
+            self.screenshot_saved(blob_name)
+        else:
+            self.status_bar.showMessage("Full-page screenshot failed", 3000)
         
-        # Display notification with URL
-        QMessageBox.information(
-            self, 
-            "Screenshot Captured",
-            f"Screenshot saved and available at:\nhttp://localhost:{self.server_port}/{os.path.basename(filepath)}"
-        )
+    def screenshot_saved(self, blob_name):
+        # Runs on the GUI thread once the writer has finished
+        self.status_bar.showMessage(
+            f"Screenshot saved and available at: http://localhost:{self.server_port}/{blob_name}", 5000)
         
-    def update_screenshot_index(self):
-        # Create an index.html file that lists all screenshots
-        screenshots = [f for f in os.listdir(self.screenshot_dir) if f.endswith('.png') and f != "live_view.png"]
-        screenshots.sort(reverse=True)  # Most recent first
+    def render_screenshot_index(self, page=1, per_page=50):
+        """Render one page of the screenshot index from the store's manifest"""
+        total = self.screenshot_store.count()
+        pages = max(1, (total + per_page - 1) // per_page)
+        page = min(max(page, 1), pages)
+        screenshots = self.screenshot_store.page(page, per_page)
         
         html_content = """
         <!DOCTYPE html>
@@ -282,6 +511,10 @@ class WebBrowser(QMainWindow):
                     font-size: 0.8em;
                     margin-bottom: 5px;
                 }
+                .pages {
+                    margin: 20px 0;
+                    color: #666;
+                }
             </style>
         </head>
         <body>
@@ -289,31 +522,31 @@ class WebBrowser(QMainWindow):
             <a href="live_view.html" class="live-view-link">View Live Stream (Auto-updating every 100ms)</a>
         """
         
-        for screenshot in screenshots:
-            # Skip the live view screenshot
-            if screenshot == "live_view.png":
-                continue
-                
-            # Extract timestamp from filename
-            timestamp_str = screenshot.split('_')[-1].split('.')[0]
-            date_str = screenshot.split('_')[-2]
-            formatted_time = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]} {timestamp_str[:2]}:{timestamp_str[2:4]}:{timestamp_str[4:]}"
+        for blob_name, url, captured_at in screenshots:
+            formatted_time = datetime.fromtimestamp(captured_at).strftime("%Y-%m-%d %H:%M:%S")
+            source = f" &middot; {html.escape(url)}" if url else ""
             
             html_content += f"""
             <div class="screenshot">
-                <div class="timestamp">Captured: {formatted_time}</div>
-                <img src="{screenshot}" alt="Screenshot {screenshot}">
+                <div class="timestamp">Captured: {formatted_time}{source}</div>
+                <img src="{blob_name}" alt="Screenshot {html.escape(url or blob_name)}" loading="lazy">
             </div>
             """
         
+        # Page navigation
+        html_content += '<div class="pages">'
+        if page > 1:
+            html_content += f'<a href="index.html?page={page - 1}">&laquo; Newer</a> '
+        html_content += f'Page {page} of {pages} ({total} screenshots)'
+        if page < pages:
+            html_content += f' <a href="index.html?page={page + 1}">Older &raquo;</a>'
+        html_content += '</div>'
+        
         html_content += """
         </body>
         </html>
         """
-        
-        # Write to index.html
-        with open(os.path.join(self.screenshot_dir, "index.html"), "w") as f:
-            f.write(html_content)
+        return html_content
             
     def start_http_server(self):
         # Create a custom HTTP request handler
@@ -325,6 +558,24 @@ class WebBrowser(QMainWindow):
                 # Silence server logs
                 pass
                 
+            def do_GET(self):
+                # The index is rendered per request from the SQLite index
+                parsed = urllib.parse.urlparse(self.path)
+                if parsed.path in ('/', '/index.html'):
+                    params = urllib.parse.parse_qs(parsed.query)
+                    try:
+                        page = int(params.get('page', ['1'])[0])
+                    except ValueError:
+                        page = 1
+                    body = self.browser.render_screenshot_index(page).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    super().do_GET()
+                
             def end_headers(self):
                 # Add headers to prevent caching for live_view.png
                 path = self.path.split('?')[0]  # Remove query parameters
@@ -336,6 +587,7 @@ class WebBrowser(QMainWindow):
         
         # Set the directory attribute for the handler class
         ScreenshotHandler.server_directory = self.screenshot_dir
+        ScreenshotHandler.browser = self
         
         # Create initial live_view.html file
         self.update_live_view_page()